@@ -0,0 +1,166 @@
+import gc
+import json
+import os
+import statistics
+import timeit
+import tracemalloc
+from itertools import product
+from typing import Callable, Dict, List, Sequence, Tuple
+from src.device.iot_device import SimulatedIoTDevice
+from src.network.channel import SimulatedChannel
+from src.security.array_vault import ArrayVault
+from src.security.auth_protocol import AuthenticationMessage
+from src.security.epoch_vault import EpochVault
+from src.security.secure_vault import SecureVault
+from src.server.device_registry import serialize_vault
+from src.server.iot_server import IoTServer
+from src.simulation.memory import deep_sizeof
+from src.simulation.runner import SimulationRunner
+from src.simulation.scheduler import VirtualClock
+
+VAULT_BACKENDS = {'secure': SecureVault, 'array': ArrayVault, 'epoch': EpochVault}
+
+def _time_call(func: Callable[[], object], repeat: int, min_time_s: float) -> Dict[str, float]:
+    # Numero di iterazioni scelto in modo che ogni ripetizione duri almeno min_time_s
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time_s:
+        number *= 2
+    samples = [t / number * 1e6 for t in timer.repeat(repeat, number)]
+    return {
+        'median_us': statistics.median(samples),
+        'min_us': min(samples),
+        'max_us': max(samples),
+        'iterations': number
+    }
+
+def _micro_cases(n: int, m: int, backend: str) -> List[Tuple[str, Callable[[], object]]]:
+    vault_cls = VAULT_BACKENDS[backend]
+    vault = vault_cls(n, m)
+    challenge = [0, n // 2, n - 1]
+
+    device = SimulatedIoTDevice('bench_dev', lambda: vault_cls(n, m))
+    server = IoTServer()
+    server.register_device(device.device_id, device.vault)
+    challenge_msg = server.handle_auth_phase1(device.authenticator.initiate_auth())
+    phase1_msg = AuthenticationMessage(session_id='bench', device_id=device.device_id)
+
+    def device_handshake():
+        device.authenticator.initiate_auth()
+        return device.authenticator.handle_challenge(challenge_msg)
+
+    return [
+        ('vault.generate_response', lambda: vault.generate_response(challenge)),
+        ('vault.update_vault', lambda: vault.update_vault(b'bench-session')),
+        ('authenticator.initiate_auth', device.authenticator.initiate_auth),
+        ('authenticator.initiate_auth+handle_challenge', device_handshake),
+        ('server.handle_auth_phase1', lambda: server.handle_auth_phase1(phase1_msg)),
+    ]
+
+def _macro_case(fleet_size: int, n: int, m: int,
+                backend: str) -> Tuple[str, Callable[[], object]]:
+    vault_cls = VAULT_BACKENDS[backend]
+    runner = SimulationRunner(fleet_size, vault_factory=lambda: vault_cls(n, m))
+    # Canale a latenza nulla: si misura solo il costo di calcolo dell'handshake
+    runner.channel = SimulatedChannel(0, 0, clock=VirtualClock())
+
+    def authenticate_fleet():
+        for device in runner.devices:
+            runner._run_authentication(device)
+
+    return 'runner._run_authentication[fleet]', authenticate_fleet
+
+def run_benchmarks(n_values: Sequence[int] = (10, 100, 1000),
+                   m_values: Sequence[int] = (128, 256),
+                   fleet_sizes: Sequence[int] = (10, 100),
+                   backends: Sequence[str] = ('secure', 'array', 'epoch'),
+                   repeat: int = 5, min_time_s: float = 0.05) -> Dict[str, Dict[str, float]]:
+    """Esegue micro e macro benchmark; la chiave identifica caso e parametri"""
+    results = {}
+    for backend, n, m in product(backends, n_values, m_values):
+        for name, func in _micro_cases(n, m, backend):
+            results[f'{name}[{backend},n={n},m={m}]'] = _time_call(func, repeat, min_time_s)
+        for fleet_size in fleet_sizes:
+            name, func = _macro_case(fleet_size, n, m, backend)
+            key = f'{name}[{backend},n={n},m={m},fleet={fleet_size}]'
+            timing = _time_call(func, repeat, min_time_s)
+            timing['per_handshake_us'] = timing['median_us'] / fleet_size
+            results[key] = timing
+    return results
+
+def _traced_growth(func: Callable[[], object]) -> Tuple[object, int]:
+    # Crescita della memoria Python mentre il risultato di func è ancora vivo
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+def _memory_case(n: int, m: int, backend: str, num_devices: int) -> Dict[str, float]:
+    vault_cls = VAULT_BACKENDS[backend]
+    devices, devices_bytes = _traced_growth(
+        lambda: [SimulatedIoTDevice(f'mem_{i}', lambda: vault_cls(n, m))
+                 for i in range(num_devices)])
+    server = IoTServer()
+    server.register_devices((device.device_id, device.vault) for device in devices)
+    # Vault deserializzati nell'hot set del registro (il database SQLite non è tracciato)
+    _, hot_bytes = _traced_growth(
+        lambda: [server.devices.get(device.device_id) for device in devices])
+    requests = [device.authenticator.initiate_auth() for device in devices]
+
+    def open_sessions():
+        # Le risposte vengono scartate: resta solo ciò che la sessione referenzia
+        for msg in requests:
+            server.handle_auth_phase1(msg)
+
+    _, session_bytes = _traced_growth(open_sessions)
+    return {
+        'device_bytes': devices_bytes / num_devices,
+        'vault_bytes': deep_sizeof(devices[0].vault),
+        'vault_serialized_bytes': len(serialize_vault(devices[0].vault)),
+        'registry_hot_bytes': hot_bytes / num_devices,
+        'session_bytes': session_bytes / num_devices
+    }
+
+def run_memory_footprint(n_values: Sequence[int] = (10, 100, 1000),
+                         m_values: Sequence[int] = (128, 256),
+                         backends: Sequence[str] = ('secure', 'array', 'epoch'),
+                         num_devices: int = 200) -> Dict[str, Dict[str, float]]:
+    """Byte misurati per dispositivo, vault e sessione al variare di backend, n e m"""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        return {f'memory[{backend},n={n},m={m}]': _memory_case(n, m, backend, num_devices)
+                for backend, n, m in product(backends, n_values, m_values)}
+    finally:
+        if started:
+            tracemalloc.stop()
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]],
+                        baseline: Dict[str, Dict[str, float]],
+                        threshold: float = 0.10) -> List[Dict[str, float]]:
+    """Restituisce i casi più lenti della baseline di oltre `threshold` (mediana)"""
+    regressions = []
+    for key, timing in sorted(results.items()):
+        reference = baseline.get(key)
+        if not reference or not reference.get('median_us'):
+            continue
+        ratio = timing['median_us'] / reference['median_us']
+        if ratio > 1 + threshold:
+            regressions.append({
+                'case': key,
+                'baseline_us': reference['median_us'],
+                'current_us': timing['median_us'],
+                'slowdown': ratio - 1
+            })
+    return regressions
@@ -1,26 +1,212 @@
-from typing import List
-from src.simulation.metrics import SimulationMetrics
+import json
+import math
+import os
+import resource
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from src.network.channel import SimulatedChannel
+from src.simulation.metrics import SimulationMetrics, PHASES
+from src.simulation.runner import SimulationRunner
+from src.simulation.results_sink import load_streaming_metrics
+from src.security.campaign import aggregate_results
+
+def geometric_range(start: int, stop: int, factor: float = 10) -> List[int]:
+    """Valori start, start*factor, ... fino a stop incluso"""
+    if start < 1 or factor <= 1:
+        raise ValueError("Servono start >= 1 e factor > 1")
+    values = []
+    value = float(start)
+    while value <= stop:
+        values.append(int(round(value)))
+        value *= factor
+    return values
+
+def fit_power_law(xs: Sequence[float], ys: Sequence[float]) -> Dict[str, float]:
+    """Regressione log-log di y = a * x^b; b ≈ 1 indica scalabilità lineare"""
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return {'coefficient': 0.0, 'exponent': 0.0, 'r_squared': 0.0}
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    exponent = sxy / sxx if sxx else 0.0
+    r_squared = (sxy * sxy) / (sxx * syy) if sxx and syy else 1.0
+    return {
+        'coefficient': math.exp(mean_y - exponent * mean_x),
+        'exponent': exponent,
+        'r_squared': r_squared
+    }
+
+def _current_rss_kb() -> float:
+    # RSS attuale da /proc su Linux, altrimenti il picco riportato da getrusage
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024
+    except (OSError, ValueError, IndexError):
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
 
 class PerformanceAnalyzer:
     def __init__(self):
         self.auth_times: List[float] = []
         self.power_readings: List[float] = []
-        
+        self.last_sweep: Optional[Dict] = None
+
     def analyze_authentication_performance(self, metrics: SimulationMetrics) -> dict:
-        avg_auth_time = sum(metrics.auth_time_ms) / len(metrics.auth_time_ms)
-        avg_power = sum(metrics.power_consumption_mwh) / len(metrics.power_consumption_mwh)
-        
+        # Le statistiche funzionano sia con i campioni sia con gli istogrammi in streaming
+        auth_time = metrics.summary('auth_time_ms')
+        power = metrics.summary('power_consumption_mwh')
+
         return {
-            'avg_auth_time_ms': avg_auth_time,
-            'avg_power_mwh': avg_power,
+            'avg_auth_time_ms': auth_time['mean'],
+            'avg_power_mwh': power['mean'],
+            'auth_time_p50_ms': auth_time['p50'],
+            'auth_time_p95_ms': auth_time['p95'],
+            'auth_time_p99_ms': auth_time['p99'],
+            'auth_time_max_ms': auth_time['max'],
+            'phase_energy_mwh': {
+                phase: metrics.summary(f'phase:{phase}') for phase in PHASES
+            },
             'success_rate': self._calculate_success_rate(metrics),
             'scalability_factor': self._analyze_scalability(metrics)
         }
-        
+
+    def analyze_results_file(self, path: str) -> dict:
+        """Stesse aggregazioni calcolate in streaming su un file scritto da un ResultsSink"""
+        metrics, attacks = load_streaming_metrics(path)
+        report = self.analyze_authentication_performance(metrics)
+        report['handshakes'] = metrics.count()
+        report['attacks'] = aggregate_results(attacks)
+        return report
+
     def _calculate_success_rate(self, metrics: SimulationMetrics) -> float:
-        # Implementazione semplificata
-        return 1.0
-        
-    def _analyze_scalability(self, metrics: SimulationMetrics) -> float:
-        # Implementazione semplificata
-        return 1.0 
\ No newline at end of file
+        # Handshake verificati dal server sul totale degli handshake misurati
+        return metrics.success_rate()
+
+    def _analyze_scalability(self, metrics: SimulationMetrics) -> Optional[float]:
+        # Esponente throughput/concorrenza della flotta più grande dell'ultimo sweep (1.0 = lineare)
+        if self.last_sweep is None or not self.last_sweep['throughput_fit']:
+            return None
+        fits = self.last_sweep['throughput_fit']
+        return fits[max(fits)]['exponent']
+
+    def run_scalability_sweep(self, min_devices: int = 100, max_devices: int = 10000,
+                              device_factor: float = 10,
+                              concurrency_levels: Sequence[int] = (1, 10, 100, 1000),
+                              latency_ms: float = 50, jitter_ms: float = 10,
+                              seed: int = 0, linear_threshold: float = 0.8,
+                              output_path: str = None) -> Dict:
+        """Esegue la simulazione concorrente su una griglia di dimensioni flotta x concorrenza"""
+        points = []
+        for num_devices in geometric_range(min_devices, max_devices, device_factor):
+            baseline = None
+            for concurrency in concurrency_levels:
+                if concurrency > num_devices:
+                    continue  # oltre la dimensione della flotta la concorrenza non cresce
+                # Tempo simulato: le latenze di rete non si attendono davvero e il throughput
+                # riflette il calcolo di server e dispositivi, non solo concorrenza/latenza
+                runner = SimulationRunner(num_devices, virtual_time=True, seed=seed,
+                                          streaming_metrics=True)
+                runner.channel = SimulatedChannel(latency_ms, jitter_ms,
+                                                  clock=runner.scheduler.clock)
+                rss_before = _current_rss_kb()
+                report = runner.run_concurrent_simulation(concurrency)
+                rss_after = _current_rss_kb()
+
+                point = {
+                    'devices': num_devices,
+                    'concurrency': concurrency,
+                    'throughput_hps': report['throughput_hps'],
+                    'latency_ms': {
+                        'p50': report['p50_ms'],
+                        'p95': report['p95_ms'],
+                        'p99': report['p99_ms'],
+                        'max': report['max_ms']
+                    },
+                    'success_rate': runner.metrics.success_rate(),
+                    # RSS dell'intero processo: include dispositivi e metriche, non solo il server
+                    'process_rss_kb': rss_after,
+                    'process_rss_delta_kb': rss_after - rss_before,
+                    'vault_hot_set': runner.server.devices.stats()['hot_set'],
+                    'sessions': report['session_stats']
+                }
+                # Efficienza rispetto alla crescita lineare dal primo livello di concorrenza
+                if baseline is None:
+                    baseline = point
+                ideal = baseline['throughput_hps'] * concurrency / baseline['concurrency']
+                point['scaling_efficiency'] = point['throughput_hps'] / ideal if ideal else 0.0
+                points.append(point)
+
+        result = {
+            'points': points,
+            # Una curva throughput/concorrenza per ogni dimensione della flotta
+            'throughput_fit': {
+                devices: fit_power_law(
+                    [p['concurrency'] for p in points if p['devices'] == devices],
+                    [p['throughput_hps'] for p in points if p['devices'] == devices])
+                for devices in dict.fromkeys(p['devices'] for p in points)
+            },
+            'latency_fit': fit_power_law([p['devices'] for p in points],
+                                         [p['latency_ms']['p50'] for p in points]),
+            'linear_limit': self._linear_limit(points, linear_threshold),
+            'success_rate': (sum(p['success_rate'] * p['devices'] for p in points) /
+                             sum(p['devices'] for p in points)) if points else 0.0
+        }
+        self.last_sweep = result
+
+        if output_path:
+            with open(output_path, 'w') as f:
+                json.dump(result, f, indent=2)
+        return result
+
+    def run_load_curve(self, rates_hps: Sequence[float] = (250, 500, 1000, 2000, 4000, 8000),
+                       duration_s: float = 5.0, schedule: str = 'poisson',
+                       num_devices: int = 5000, latency_ms: float = 50, jitter_ms: float = 10,
+                       seed: int = 0, saturation_threshold: float = 0.9,
+                       output_path: str = None) -> Dict:
+        """Curva throughput/latenza in open loop: un punto per tasso di arrivo offerto"""
+        points = []
+        for rate_hps in rates_hps:
+            runner = SimulationRunner(num_devices, virtual_time=True, seed=seed)
+            runner.channel = SimulatedChannel(latency_ms, jitter_ms,
+                                              clock=runner.scheduler.clock)
+            report = runner.run_open_loop(rate_hps, duration_s, schedule,
+                                          np.random.default_rng(seed))
+            points.append({
+                'target_hps': rate_hps,
+                'offered_hps': report['offered_hps'],
+                'throughput_hps': report['throughput_hps'],
+                'latency_ms': {key: report['latency_ms'][key]
+                               for key in ('p50', 'p95', 'p99', 'max')},
+                'queue_wait_p99_ms': report['queue_wait_ms']['p99'],
+                'server_utilization': report['server_utilization'],
+                'success_rate': report['success_rate'],
+                'device_waits': report['device_waits']
+            })
+
+        # Saturazione: primo tasso offerto che il server non riesce più a smaltire
+        saturation = next((point['offered_hps'] for point in points
+                           if point['throughput_hps'] <
+                           saturation_threshold * point['offered_hps']), None)
+        result = {
+            'schedule': schedule,
+            'points': points,
+            'saturation_hps': saturation,
+            'max_throughput_hps': max((point['throughput_hps'] for point in points), default=0.0)
+        }
+        if output_path:
+            with open(output_path, 'w') as f:
+                json.dump(result, f, indent=2)
+        return result
+
+    def _linear_limit(self, points: List[Dict], threshold: float) -> Dict[int, Optional[int]]:
+        # Per ogni flotta, la prima concorrenza in cui l'efficienza scende sotto la soglia
+        limits: Dict[int, Optional[int]] = {}
+        for point in points:
+            limits.setdefault(point['devices'], None)
+            if (limits[point['devices']] is None
+                    and point['scaling_efficiency'] < threshold):
+                limits[point['devices']] = point['concurrency']
+        return limits
@@ -0,0 +1,67 @@
+from typing import Iterable, Tuple, Union
+import numpy as np
+from src.device.iot_device import DeviceSpecs, SimulatedIoTDevice
+
+# Metriche per dispositivo che esistono sia come colonne sia come attributi dei dispositivi
+FLEET_COLUMNS = ('power_consumption', 'cpu_usage', 'memory_usage', 'auth_attempts')
+
+class DeviceFleet:
+    """Stato energetico/CPU/memoria della flotta come colonne NumPy indicizzate per dispositivo"""
+    def __init__(self, num_devices: int, specs: DeviceSpecs = None):
+        self.specs = specs or DeviceSpecs()
+        self.power_consumption = np.zeros(num_devices)  # mWh cumulativi
+        self.cpu_usage = np.zeros(num_devices)
+        self.memory_usage = np.zeros(num_devices)       # KB
+        self.auth_attempts = np.zeros(num_devices, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.power_consumption)
+
+    def read_devices(self, devices: Iterable[Tuple[int, SimulatedIoTDevice]]):
+        """Copia nelle colonne le metriche degli oggetti dispositivo (posizione, dispositivo)"""
+        for position, device in devices:
+            for name in FLEET_COLUMNS:
+                getattr(self, name)[position] = getattr(device, name)
+
+    def write_devices(self, devices: Iterable[Tuple[int, SimulatedIoTDevice]]):
+        # Operazione inversa: gli oggetti dispositivo riprendono i valori delle colonne
+        for position, device in devices:
+            device.power_consumption = float(self.power_consumption[position])
+            device.cpu_usage = float(self.cpu_usage[position])
+            device.memory_usage = float(self.memory_usage[position])
+            device.auth_attempts = int(self.auth_attempts[position])
+
+    def simulate_power_consumption(self, operation_time_ms: Union[float, np.ndarray],
+                                   indices=slice(None)) -> np.ndarray:
+        """Stesso modello di SimulatedIoTDevice, in un'unica operazione; restituisce i mWh"""
+        specs = self.specs
+        cpu_usage = self.cpu_usage[indices]
+        current_ma = specs.base_current_ma + (specs.peak_current_ma - specs.base_current_ma) * cpu_usage
+        energy_mwh = specs.voltage_v * current_ma * operation_time_ms / 3600.0
+
+        self.power_consumption[indices] += energy_mwh
+        self.cpu_usage[indices] = np.minimum(1.0, cpu_usage + 0.2)
+        self.memory_usage[indices] = np.minimum(
+            specs.memory_kb, self.memory_usage[indices] + np.multiply(operation_time_ms, 0.1)
+        )
+        return energy_mwh
+
+    def reset_metrics(self, indices=slice(None)):
+        # Come SimulatedIoTDevice.reset_metrics: l'energia cumulativa non si azzera
+        self.cpu_usage[indices] = 0.0
+        self.memory_usage[indices] = 0.0
+        self.auth_attempts[indices] += 1
+
+    def get_power_profile(self, index: int) -> dict:
+        specs = self.specs
+        current_ma = (specs.base_current_ma +
+                      (specs.peak_current_ma - specs.base_current_ma) * float(self.cpu_usage[index]))
+        return {
+            'voltage_v': specs.voltage_v,
+            'current_ma': current_ma,
+            'power_mw': specs.voltage_v * current_ma,
+            'total_energy_mwh': float(self.power_consumption[index])
+        }
+
+    def total_energy_mwh(self) -> float:
+        return float(self.power_consumption.sum())
@@ -1,8 +1,12 @@
 import secrets
 from dataclasses import dataclass
+from typing import Callable
 from src.security.auth_protocol import DeviceAuthenticator
 from src.security.secure_vault import SecureVault
 
+# Tempi di elaborazione sul dispositivo per fase dell'handshake (ms), comuni a tutti i driver
+PHASE_DURATIONS_MS = {'init': 20.0, 'challenge': 30.0, 'response': 40.0, 'vault_update': 25.0}
+
 @dataclass
 class DeviceSpecs:
     memory_kb: int = 32
@@ -12,11 +16,12 @@ class DeviceSpecs:
     peak_current_ma: float = 20.0
 
 class SimulatedIoTDevice:
-    def __init__(self, device_id: str):
+    def __init__(self, device_id: str,
+                 vault_factory: Callable[[], SecureVault] = SecureVault):
         self.device_id = device_id
         self.specs = DeviceSpecs()
-        # Inizializza prima il vault
-        vault = SecureVault()
+        # Inizializza prima il vault (SecureVault o un backend alternativo, es. ArrayVault)
+        vault = vault_factory()
         # Poi crea l'authenticator passando il vault e device_id
         self.authenticator = DeviceAuthenticator(vault)
         self.authenticator.set_device_id(device_id)
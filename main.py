@@ -1,18 +1,124 @@
+import argparse
 from src.simulation.runner import SimulationRunner
 from src.analysis.performance import PerformanceAnalyzer
+from src.analysis import benchmarks
+from src.simulation.results_sink import open_results_sink
+
+def run_sweep(output_path: str):
+    analyzer = PerformanceAnalyzer()
+    result = analyzer.run_scalability_sweep(output_path=output_path)
+    for point in result['points']:
+        print(f"{point['devices']:>7} dispositivi, concorrenza {point['concurrency']:>5}: "
+              f"{point['throughput_hps']:.1f} handshake/s, "
+              f"p99 {point['latency_ms']['p99']:.2f} ms, "
+              f"efficienza {point['scaling_efficiency']:.2f}")
+    print(f"Limite lineare per flotta: {result['linear_limit']}")
+    print(f"Risultati salvati in {output_path}")
+
+def run_benchmarks(baseline_path: str, update: bool, threshold: float) -> int:
+    results = benchmarks.run_benchmarks()
+    for case, timing in sorted(results.items()):
+        print(f"{case}: {timing['median_us']:.1f} us")
+    
+    baseline = benchmarks.load_baseline(baseline_path)
+    if update or not baseline:
+        benchmarks.save_baseline(results, baseline_path)
+        print(f"Baseline salvata in {baseline_path}")
+        return 0
+    
+    regressions = benchmarks.compare_to_baseline(results, baseline, threshold)
+    for regression in regressions:
+        print(f"REGRESSIONE {regression['case']}: "
+              f"{regression['baseline_us']:.1f} -> {regression['current_us']:.1f} us "
+              f"(+{regression['slowdown']*100:.1f}%)")
+    return 1 if regressions else 0
+
+def run_load_curve(output_path: str, schedule: str):
+    result = PerformanceAnalyzer().run_load_curve(schedule=schedule, output_path=output_path)
+    for point in result['points']:
+        print(f"offerti {point['offered_hps']:>8.1f} handshake/s: "
+              f"serviti {point['throughput_hps']:.1f} handshake/s, "
+              f"p50/p99 {point['latency_ms']['p50']:.1f} / {point['latency_ms']['p99']:.1f} ms, "
+              f"utilizzo server {point['server_utilization']*100:.0f}%")
+    print(f"Saturazione: {result['saturation_hps'] or 'non raggiunta'}")
+    print(f"Risultati salvati in {output_path}")
+
+def run_memory_footprint(output_path: str):
+    results = benchmarks.run_memory_footprint()
+    for case, footprint in sorted(results.items()):
+        print(f"{case}: dispositivo {footprint['device_bytes']:.0f} B, "
+              f"vault {footprint['vault_bytes']:.0f} B "
+              f"({footprint['vault_serialized_bytes']:.0f} B serializzato), "
+              f"hot set {footprint['registry_hot_bytes']:.0f} B, "
+              f"sessione {footprint['session_bytes']:.0f} B")
+    benchmarks.save_baseline(results, output_path)
+    print(f"Risultati salvati in {output_path}")
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sweep', metavar='JSON',
+                        help="esegue lo sweep di scalabilità e salva i risultati in JSON")
+    parser.add_argument('--bench', metavar='BASELINE',
+                        help="esegue i benchmark e li confronta con la baseline JSON")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="sovrascrive la baseline con i risultati correnti")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="rallentamento relativo oltre il quale segnalare una regressione")
+    parser.add_argument('--load', metavar='JSON',
+                        help="curva throughput/latenza in open loop, salvata in JSON")
+    parser.add_argument('--schedule', default='poisson',
+                        choices=['constant', 'poisson', 'bursty_ramp'],
+                        help="calendario degli arrivi per --load")
+    parser.add_argument('--memory', metavar='JSON',
+                        help="misura i byte per dispositivo, vault e sessione al variare di n/m")
+    parser.add_argument('--results', metavar='PATH',
+                        help="scrive handshake e attacchi man mano (.jsonl o colonnare)")
+    parser.add_argument('--analyze', metavar='PATH',
+                        help="calcola le statistiche da un file di risultati")
+    args = parser.parse_args()
+    if args.sweep:
+        run_sweep(args.sweep)
+        return
+    if args.bench:
+        raise SystemExit(run_benchmarks(args.bench, args.update_baseline, args.threshold))
+    if args.load:
+        run_load_curve(args.load, args.schedule)
+        return
+    if args.memory:
+        run_memory_footprint(args.memory)
+        return
+    if args.analyze:
+        report = PerformanceAnalyzer().analyze_results_file(args.analyze)
+        print(f"Handshake: {report['handshakes']}, "
+              f"p99 {report['auth_time_p99_ms']:.2f} ms, "
+              f"successo {report['success_rate']*100:.1f}%")
+        for attack, entry in report['attacks'].items():
+            print(f"{attack}: {entry['detection_rate']['rate']*100:.1f}% rilevati")
+        return
+    
     # Configurazione solo per 1000 dispositivi
     n = 1000
-    runner = SimulationRunner(n)
+    sink = open_results_sink(args.results) if args.results else None
+    # Con un sink i campioni sono già su file: in memoria restano solo gli istogrammi
+    runner = SimulationRunner(n, virtual_time=True, sink=sink,
+                              streaming_metrics=sink is not None)
     runner.run_full_simulation()
+    if sink is not None:
+        sink.close()
     
     analyzer = PerformanceAnalyzer()
     performance_metrics = analyzer.analyze_authentication_performance(runner.metrics)
     
     # Stampa risultati
+    startup = runner.startup_report()
     print(f"\nRisultati per {n} dispositivi:")
+    print(f"Avvio ({startup['provisioning']}): {startup['total_s']:.2f} s")
     print(f"Tempo medio auth: {performance_metrics['avg_auth_time_ms']:.2f} ms")
+    print(f"Latenza auth p50/p95/p99/max: "
+          f"{performance_metrics['auth_time_p50_ms']:.2f} / "
+          f"{performance_metrics['auth_time_p95_ms']:.2f} / "
+          f"{performance_metrics['auth_time_p99_ms']:.2f} / "
+          f"{performance_metrics['auth_time_max_ms']:.2f} ms")
     print(f"Consumo medio: {performance_metrics['avg_power_mwh']:.2f} mWh")
     print(f"Tasso di successo: {performance_metrics['success_rate']*100:.1f}%")
 
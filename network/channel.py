@@ -1,13 +1,85 @@
+import asyncio
 import time
 import random
+from typing import List, Tuple
+from src.security.auth_protocol import AuthenticationMessage
 
 class SimulatedChannel:
-    def __init__(self, latency_ms: float = 50, jitter_ms: float = 10):
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 10, clock=None,
+                 bandwidth_kbps: float = None):
         self.latency = latency_ms
         self.jitter = jitter_ms
+        # Se presente un VirtualClock la latenza avanza il tempo simulato
+        self.clock = clock
+        # Con una banda limitata (es. 250 kbps per 802.15.4) il tempo di trasmissione
+        # dipende dalla dimensione del payload
+        self.bandwidth_kbps = bandwidth_kbps
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        
+    def sample_delay_ms(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        
+    def airtime_ms(self, num_bytes: int) -> float:
+        if not self.bandwidth_kbps:
+            return 0.0
+        return num_bytes * 8 / self.bandwidth_kbps
+        
+    def _encode(self, data):
+        # I messaggi viaggiano nel formato binario e vengono decodificati in ricezione
+        wire = data.to_bytes() if isinstance(data, AuthenticationMessage) else data
+        self.bytes_sent += len(wire)
+        self.messages_sent += 1
+        return wire
+        
+    def _decode(self, wire, data):
+        if isinstance(data, AuthenticationMessage):
+            return AuthenticationMessage.from_bytes(wire)
+        return wire
         
     def transmit(self, data: bytes) -> bytes:
+        wire = self._encode(data)
         # Simula latenza di rete
-        delay = self.latency + random.uniform(-self.jitter, self.jitter)
-        time.sleep(delay / 1000)
-        return data 
\ No newline at end of file
+        delay = self.sample_delay_ms() + self.airtime_ms(len(wire))
+        if self.clock is not None:
+            self.clock.advance(delay)
+        else:
+            time.sleep(delay / 1000)
+        return self._decode(wire, data)
+        
+    async def transmit_async(self, data: bytes) -> bytes:
+        # Variante awaitable: permette di interlacciare più handshake in tempo reale
+        if self.clock is not None:
+            # Avanzare il clock senza cedere il controllo serializzerebbe gli handshake
+            raise ValueError("Con un clock simulato usare send() e schedulare la consegna")
+        wire = self._encode(data)
+        await asyncio.sleep((self.sample_delay_ms() + self.airtime_ms(len(wire))) / 1000)
+        return self._decode(wire, data)
+        
+    def send(self, data) -> Tuple[object, float]:
+        # Invio senza attesa: il chiamante schedula la consegna dopo il ritardo restituito
+        wire = self._encode(data)
+        delay = self.sample_delay_ms() + self.airtime_ms(len(wire))
+        return self._decode(wire, data), delay
+        
+    def transmit_batch(self, messages: List) -> Tuple[List, List[float]]:
+        # Messaggi in volo contemporaneamente: il tempo avanza del ritardo massimo
+        received = []
+        delays = []
+        for data in messages:
+            message, delay = self.send(data)
+            received.append(message)
+            delays.append(delay)
+        if delays:
+            if self.clock is not None:
+                self.clock.advance(max(delays))
+            else:
+                time.sleep(max(delays) / 1000)
+        return received, delays
+        
+    def stats(self) -> dict:
+        return {
+            'messages_sent': self.messages_sent,
+            'bytes_sent': self.bytes_sent,
+            'mean_message_bytes': self.bytes_sent / self.messages_sent if self.messages_sent else 0.0
+        }
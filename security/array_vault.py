@@ -0,0 +1,103 @@
+import secrets
+import hmac
+import hashlib
+import struct
+from typing import List, Tuple
+import numpy as np
+from cryptography.fernet import Fernet
+from src.security.secure_vault import SecureVault
+
+class ArrayVault:
+    """Vault con le n chiavi in un'unica matrice n x m/8 cifrata come un solo blocco"""
+    def __init__(self, n: int = 10, m: int = 128):
+        self.n = n  # numero di chiavi
+        self.m = m  # dimensione chiave in bit
+        self.encryption_key = Fernet.generate_key()
+        self.fernet = Fernet(self.encryption_key)
+        self._wrapped = self._wrap(
+            np.frombuffer(secrets.token_bytes(n * (m // 8)), dtype=np.uint8)
+        )
+
+    @classmethod
+    def from_secure_vault(cls, vault: SecureVault) -> 'ArrayVault':
+        # Converte un SecureVault esistente mantenendo chiavi e chiave di cifratura
+        return cls.from_material(vault.encryption_key,
+                                 vault.get_keys_by_indices(range(vault.n)), vault.m)
+
+    @classmethod
+    def from_material(cls, encryption_key: bytes, raw_keys: List[bytes],
+                      m: int = 128) -> 'ArrayVault':
+        array_vault = cls.__new__(cls)
+        array_vault.n = len(raw_keys)
+        array_vault.m = m
+        array_vault.encryption_key = encryption_key
+        array_vault.fernet = Fernet(encryption_key)
+        raw = np.frombuffer(b''.join(raw_keys), dtype=np.uint8)
+        array_vault._wrapped = array_vault._wrap(raw)
+        return array_vault
+
+    def to_bytes(self) -> bytes:
+        header = struct.pack('>HHH', self.n, self.m, len(self.encryption_key))
+        return header + self.encryption_key + self._wrapped
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ArrayVault':
+        array_vault = cls.__new__(cls)
+        array_vault.n, array_vault.m, key_len = struct.unpack_from('>HHH', data)
+        offset = struct.calcsize('>HHH')
+        array_vault.encryption_key = bytes(data[offset:offset + key_len])
+        array_vault.fernet = Fernet(array_vault.encryption_key)
+        array_vault._wrapped = bytes(data[offset + key_len:])
+        return array_vault
+
+    def _wrap(self, matrix: np.ndarray) -> bytes:
+        return self.fernet.encrypt(matrix.tobytes())
+
+    def _unwrap(self) -> np.ndarray:
+        # bytearray rende la matrice scrivibile senza un'ulteriore copia
+        raw = bytearray(self.fernet.decrypt(self._wrapped))
+        return np.frombuffer(raw, dtype=np.uint8).reshape(self.n, self.m // 8)
+
+    def get_keys_by_indices(self, indices: List[int]) -> List[bytes]:
+        matrix = self._unwrap()
+        return [row.tobytes() for row in matrix[list(indices)]]
+
+    def generate_response(self, challenge: List[int]) -> bytes:
+        return self._combine_rows(self._unwrap(), challenge)
+
+    def _combine_rows(self, matrix: np.ndarray, challenge: List[int]) -> bytes:
+        # XOR delle righe della sfida in un'unica operazione vettoriale
+        response = np.bitwise_xor.reduce(matrix[list(challenge)], axis=0).tobytes()
+
+        h = hmac.new(self.encryption_key, response, hashlib.sha256)
+        return h.digest()
+
+    def _rotation_pad(self, session_data: bytes) -> np.ndarray:
+        h = hmac.new(self.encryption_key, session_data, hashlib.sha256)
+        hmac_value = np.frombuffer(h.digest(), dtype=np.uint8)
+
+        # Stessa rotazione di SecureVault (ogni chiave XOR con l'inizio dell'HMAC);
+        # per chiavi più lunghe di 256 bit l'HMAC viene ripetuto invece di troncare
+        return np.resize(hmac_value, self.m // 8)
+
+    def update_vault(self, session_data: bytes):
+        matrix = self._unwrap()
+        matrix ^= self._rotation_pad(session_data)
+        self._wrapped = self._wrap(matrix)
+
+    def verify_and_rotate(self, items: List[Tuple[List[int], bytes, bytes]]) -> List[bool]:
+        """Verifica in ordine (challenge, risposta, dati di sessione) con un solo unwrap/wrap"""
+        matrix = self._unwrap()
+        results = []
+        rotated = False
+        for challenge, response, session_data in items:
+            expected = self._combine_rows(matrix, challenge)
+            ok = response is not None and hmac.compare_digest(expected, response)
+            if ok:
+                matrix ^= self._rotation_pad(session_data)
+                rotated = True
+            results.append(ok)
+
+        if rotated:
+            self._wrapped = self._wrap(matrix)
+        return results
@@ -1,11 +1,12 @@
 import time
 import secrets
-import numpy as np
 from dataclasses import dataclass
 from typing import List, Dict
 from src.device.iot_device import SimulatedIoTDevice
 from src.server.iot_server import IoTServer
+from src.server.rate_limiter import AuthRateLimiter, RateLimitExceeded
 from src.network.channel import SimulatedChannel
+from src.security.side_channel import capture_power_traces, assess_leakage
 import random
 
 @dataclass
@@ -13,11 +14,25 @@ class AttackResult:
     attack_type: str
     details: str  # Contiene il rapporto attacchi rilevati/totali
     time_to_detect_ms: float
+    # Valori numerici del rapporto, per aggregare i risultati di più dispositivi
+    detected: float = 0
+    total: int = 0
+    device_id: str = None
+
+# Nome breve dell'attacco -> metodo di SecurityTestSuite
+ATTACKS = {
+    'mitm': 'test_mitm_attack',
+    'side_channel': 'test_side_channel_attack',
+    'password_prediction': 'test_password_prediction',
+    'dos': 'test_dos_attack'
+}
 
 class SecurityTestSuite:
-    def __init__(self, device: SimulatedIoTDevice, server: IoTServer):
+    def __init__(self, device: SimulatedIoTDevice, server: IoTServer, sink=None):
         self.device = device
         self.server = server
+        # Sink opzionale (simulation.results_sink): ogni risultato viene scritto subito
+        self.sink = sink
         self.channel = SimulatedChannel()
         self.results: List[AttackResult] = []
         self.attack_history = []
@@ -29,6 +44,16 @@ class SecurityTestSuite:
         self.test_dos_attack()
         return self.results
         
+    def run_attack(self, attack: str, **kwargs) -> AttackResult:
+        # Esegue un singolo attacco per nome (vedi ATTACKS) e ne restituisce il risultato
+        getattr(self, ATTACKS[attack])(**kwargs)
+        return self.results[-1]
+        
+    def _add_result(self, result: AttackResult):
+        self.results.append(result)
+        if self.sink is not None:
+            self.sink.write_attack(result)
+        
     def try_intercept_and_modify(self, message) -> Dict:
         # Simula un tentativo di modifica del messaggio
         try:
@@ -66,53 +91,33 @@ class SecurityTestSuite:
                 except Exception:
                     continue
         
-        self.results.append(AttackResult(
+        self._add_result(AttackResult(
             attack_type="MITM",
             details=f"Attacchi rilevati: {detected_attacks}/{total_attempts}",
-            time_to_detect_ms=(time.time() - start_time) * 1000
+            time_to_detect_ms=(time.time() - start_time) * 1000,
+            detected=detected_attacks,
+            total=total_attempts,
+            device_id=self.device.device_id
         ))
 
-    def test_side_channel_attack(self):
+    def test_side_channel_attack(self, num_traces: int = 10000,
+                                 devices: List[SimulatedIoTDevice] = None):
         start_time = time.time()
-        detected_patterns = 0
-        total_patterns = 50
         
-        # Raccoglie tracce di potenza durante multiple autenticazioni
-        for _ in range(total_patterns):
-            trace = []
-            initial_power = self.device.power_consumption
-            
-            # Registra il consumo durante l'intera autenticazione
-            msg1 = self.device.authenticator.initiate_auth()
-            trace.append(self.device.power_consumption - initial_power)
-            
-            msg2 = self.server.handle_auth_phase1(msg1)
-            trace.append(self.device.power_consumption - initial_power)
-            
-            msg3 = self.device.authenticator.handle_challenge(msg2)
-            trace.append(self.device.power_consumption - initial_power)
-            
-            # Aggiungi rumore realistico (3-5% del segnale)
-            noise_factor = random.uniform(0.03, 0.05)
-            # Evita valori nulli aggiungendo un offset minimo
-            trace = [max(p, 1e-6) for p in trace]  # Assicura valori positivi
-            noisy_trace = [p * (1 + random.gauss(0, noise_factor)) for p in trace]
-            
-            # Analisi delle tracce per pattern ricorrenti
-            if len(noisy_trace) >= 2:
-                # Calcola correlazione solo se le tracce hanno varianza non nulla
-                trace1 = np.array(noisy_trace[-1])
-                trace2 = np.array(noisy_trace[-2])
-                
-                if np.std(trace1) > 1e-6 and np.std(trace2) > 1e-6:
-                    correlation = np.corrcoef(trace1, trace2)[0,1]
-                    if correlation > 0.85:  # Alta correlazione potrebbe indicare una vulnerabilità
-                        detected_patterns += 1
+        # Acquisizione in una matrice preallocata e analisi vettoriale (TVLA + CPA)
+        trace_set = capture_power_traces(devices or [self.device], num_traces)
+        assessment = assess_leakage(trace_set)
         
-        self.results.append(AttackResult(
+        self._add_result(AttackResult(
             attack_type="Side-Channel",
-            details=f"Attacchi rilevati: {detected_patterns}/{total_patterns}",
-            time_to_detect_ms=(time.time() - start_time) * 1000
+            details=(f"Attacchi rilevati: {assessment['leaky_samples']}/{assessment['samples']} "
+                     f"(max |t| = {assessment['max_abs_t']:.1f}, "
+                     f"max |rho| = {assessment['max_abs_correlation']:.3f}, "
+                     f"{assessment['traces']} tracce)"),
+            time_to_detect_ms=(time.time() - start_time) * 1000,
+            detected=assessment['leaky_samples'],
+            total=assessment['samples'],
+            device_id=self.device.device_id
         ))
 
     def test_password_prediction(self):
@@ -140,41 +145,50 @@ class SecurityTestSuite:
                 elif observed_responses[i] < observed_responses[i+1]:
                     detected_attempts += 0.5
         
-        self.results.append(AttackResult(
+        self._add_result(AttackResult(
             attack_type="Password-Prediction",
             details=f"Attacchi rilevati: {detected_attempts}/{total_attempts}",
-            time_to_detect_ms=(time.time() - start_time) * 1000
+            time_to_detect_ms=(time.time() - start_time) * 1000,
+            detected=detected_attempts,
+            total=total_attempts,
+            device_id=self.device.device_id
         ))
 
-    def test_dos_attack(self):
+    def test_dos_attack(self, num_requests: int = 1_000_000, num_sources: int = 4):
         start_time = time.time()
-        MAX_REQUESTS = 1000
-        WINDOW_SIZE = 100  # ms
-        request_times = []  # Inizializzazione della lista mancante
-        detected_requests = 0
+        # Il flood passa dal rate limiter del server; se manca se ne installa uno temporaneo
+        limiter_installed = self.server.rate_limiter is None
+        if limiter_installed:
+            self.server.rate_limiter = AuthRateLimiter()
+        limiter = self.server.rate_limiter
+        stats_before = limiter.stats()
         
-        for _ in range(MAX_REQUESTS):
-            current_time = time.time() * 1000
-            
-            # Rimuovi richieste vecchie dalla finestra
-            request_times = [t for t in request_times if current_time - t < WINDOW_SIZE]
-            
-            # Se troppe richieste nella finestra, blocca
-            if len(request_times) > 50:  # Max 50 richieste per finestra
-                detected_requests += 1
-                time.sleep(0.01)  # Simula backoff
-                continue
-                
-            try:
-                self.device.authenticator.initiate_auth()
-                request_times.append(current_time)
-            except Exception:
-                detected_requests += 1
+        flood_msg = self.device.authenticator.initiate_auth()
+        sources = [f"attacker_{i}" for i in range(num_sources)]
+        detected_requests = 0
+        flood_start = time.perf_counter()
+        try:
+            for i in range(num_requests):
+                try:
+                    self.server.handle_auth_phase1(flood_msg, source=sources[i % num_sources])
+                except RateLimitExceeded:
+                    detected_requests += 1
+        finally:
+            if limiter_installed:
+                self.server.rate_limiter = None
+        flood_s = time.perf_counter() - flood_start
         
-        self.results.append(AttackResult(
+        stats = limiter.stats()
+        admitted = stats['admitted'] - stats_before['admitted']
+        throughput = num_requests / flood_s if flood_s > 0 else 0.0
+        self._add_result(AttackResult(
             attack_type="DoS",
-            details=f"Attacchi rilevati: {detected_requests}/{MAX_REQUESTS}",
-            time_to_detect_ms=(time.time() - start_time) * 1000
+            details=(f"Attacchi rilevati: {detected_requests}/{num_requests} "
+                     f"(ammesse {admitted}, {throughput:,.0f} decisioni/s)"),
+            time_to_detect_ms=(time.time() - start_time) * 1000,
+            detected=detected_requests,
+            total=num_requests,
+            device_id=self.device.device_id
         ))
 
     def generate_security_report(self) -> str:
@@ -1,6 +1,6 @@
 import secrets
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+import struct
+from typing import List, Optional, Tuple, Union
 import hmac
 import hashlib
 from enum import Enum
@@ -13,13 +13,92 @@ class AuthState(Enum):
     FAILED = 3
     AUTH_STARTED = 4
 
-@dataclass
+# Formato binario: versione, campi presenti, lunghezze, session id grezzo (16 byte)
+WIRE_VERSION = 1
+WIRE_HEADER = struct.Struct('>BBBBBB16s')
+_HAS_DEVICE_ID, _HAS_CHALLENGE, _HAS_RANDOM, _HAS_RESPONSE = 1, 2, 4, 8
+
 class AuthenticationMessage:
-    session_id: str
-    device_id: Optional[str] = None
-    challenge: Optional[List[int]] = None
-    random_number: Optional[bytes] = None
-    response: Optional[bytes] = None
+    __slots__ = ('session_id', 'device_id', 'challenge', 'random_number', 'response')
+
+    def __init__(self, session_id: str, device_id: Optional[str] = None,
+                 challenge: Optional[List[int]] = None,
+                 random_number: Optional[bytes] = None,
+                 response: Optional[bytes] = None):
+        self.session_id = session_id
+        self.device_id = device_id
+        self.challenge = challenge
+        self.random_number = random_number
+        self.response = response
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, AuthenticationMessage):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"AuthenticationMessage({fields})"
+
+    def wire_size(self) -> int:
+        # Dimensione di to_bytes() senza codificare il messaggio
+        return (WIRE_HEADER.size +
+                (len(self.device_id.encode()) if self.device_id is not None else 0) +
+                2 * len(self.challenge or ()) +
+                len(self.random_number or b'') + len(self.response or b''))
+
+    def to_bytes(self) -> bytes:
+        """Codifica a layout fisso: header, device id, indici uint16, random, risposta"""
+        try:
+            session = bytes.fromhex(self.session_id)
+        except (TypeError, ValueError):
+            session = b''
+        if len(session) != 16:
+            raise ValueError("Il session id deve essere di 16 byte in esadecimale")
+        device_id = self.device_id.encode() if self.device_id is not None else b''
+        challenge = self.challenge if self.challenge is not None else ()
+        random_number = self.random_number if self.random_number is not None else b''
+        response = self.response if self.response is not None else b''
+        if max(len(device_id), len(challenge), len(random_number), len(response)) > 255:
+            raise ValueError("Campo troppo lungo per il formato binario")
+
+        flags = ((_HAS_DEVICE_ID if self.device_id is not None else 0) |
+                 (_HAS_CHALLENGE if self.challenge is not None else 0) |
+                 (_HAS_RANDOM if self.random_number is not None else 0) |
+                 (_HAS_RESPONSE if self.response is not None else 0))
+        try:
+            indices = struct.pack(f'>{len(challenge)}H', *challenge)
+        except struct.error:
+            raise ValueError("Indici della challenge fuori dall'intervallo uint16")
+        return b''.join((
+            WIRE_HEADER.pack(WIRE_VERSION, flags, len(device_id), len(challenge),
+                             len(random_number), len(response), session),
+            device_id, indices, random_number, response
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> 'AuthenticationMessage':
+        # random_number e response restano viste sul buffer ricevuto (nessuna copia)
+        view = memoryview(data)
+        if len(view) < WIRE_HEADER.size:
+            raise ValueError("Messaggio troncato")
+        (version, flags, id_len, num_indices, random_len, response_len,
+         session) = WIRE_HEADER.unpack_from(view)
+        if version != WIRE_VERSION:
+            raise ValueError(f"Versione del formato non supportata: {version}")
+        offset = WIRE_HEADER.size
+        if len(view) != offset + id_len + 2 * num_indices + random_len + response_len:
+            raise ValueError("Lunghezza del messaggio non valida")
+
+        device_id = str(view[offset:offset + id_len], 'utf-8') if flags & _HAS_DEVICE_ID else None
+        offset += id_len
+        challenge = (list(struct.unpack_from(f'>{num_indices}H', view, offset))
+                     if flags & _HAS_CHALLENGE else None)
+        offset += 2 * num_indices
+        random_number = view[offset:offset + random_len] if flags & _HAS_RANDOM else None
+        offset += random_len
+        response = view[offset:offset + response_len] if flags & _HAS_RESPONSE else None
+        return cls(session.hex(), device_id, challenge, random_number, response)
 
 class DeviceAuthenticator:
     def __init__(self, vault: SecureVault):
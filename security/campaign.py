@@ -0,0 +1,88 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Dict, Iterable, List, Sequence
+from src.device.iot_device import SimulatedIoTDevice
+from src.security.attack_simulator import ATTACKS, AttackResult, SecurityTestSuite
+from src.server.iot_server import IoTServer
+from src.simulation.provisioning import FleetProvisioner
+
+# Attacchi dominati dalla crittografia o dall'analisi numerica -> processi;
+# gli altri passano per canale/server e restano su thread
+PROCESS_BOUND_ATTACKS = {'side_channel', 'password_prediction', 'dos'}
+
+def wilson_interval(detected: float, total: int, z: float = 1.96) -> Dict[str, float]:
+    """Intervallo di confidenza di Wilson per un tasso di rilevamento"""
+    if total <= 0:
+        return {'rate': 0.0, 'low': 0.0, 'high': 0.0}
+    rate = detected / total
+    denom = 1 + z * z / total
+    centre = (rate + z * z / (2 * total)) / denom
+    margin = z * math.sqrt(rate * (1 - rate) / total + z * z / (4 * total * total)) / denom
+    return {'rate': rate, 'low': max(0.0, centre - margin), 'high': min(1.0, centre + margin)}
+
+def _run_attack_job(provisioner: FleetProvisioner, index: int,
+                    attack: str, kwargs: dict) -> AttackResult:
+    # Ogni job ricostruisce dispositivo e server dal seed: si serializza solo il provisioner
+    device = SimulatedIoTDevice(provisioner.device_id(index),
+                                partial(provisioner.build_vault, index))
+    server = IoTServer(provisioner=provisioner)
+    return SecurityTestSuite(device, server).run_attack(attack, **kwargs)
+
+def aggregate_results(results: List[AttackResult]) -> Dict[str, Dict]:
+    summary: Dict[str, Dict] = {}
+    for result in results:
+        entry = summary.setdefault(result.attack_type, {
+            'devices': 0, 'detected': 0, 'total': 0, 'time_to_detect_ms': 0.0
+        })
+        entry['devices'] += 1
+        entry['detected'] += result.detected
+        entry['total'] += result.total
+        entry['time_to_detect_ms'] += result.time_to_detect_ms
+    for entry in summary.values():
+        entry['detection_rate'] = wilson_interval(entry['detected'], entry['total'])
+        entry['mean_time_to_detect_ms'] = entry.pop('time_to_detect_ms') / entry['devices']
+    return summary
+
+def run_attack_campaign(provisioner: FleetProvisioner,
+                        indices: Iterable[int] = None,
+                        attacks: Sequence[str] = tuple(ATTACKS),
+                        attack_kwargs: Dict[str, dict] = None,
+                        max_workers: int = None, max_threads: int = 32,
+                        sink=None) -> Dict:
+    """Esegue ogni attacco contro ogni dispositivo della flotta derivata dal seed"""
+    if indices is None:
+        indices = range(provisioner.device_offset,
+                        provisioner.device_offset + provisioner.num_devices)
+    indices = list(indices)
+    for attack in attacks:
+        if attack not in ATTACKS:
+            raise ValueError(f"Attacco sconosciuto: {attack}")
+    attack_kwargs = attack_kwargs or {}
+    max_workers = max_workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as processes, \
+            ThreadPoolExecutor(max_workers=max_threads) as threads:
+        futures = []
+        # I processi vengono creati (fork) alla prima submit: gli attacchi su processi sono
+        # inviati prima che i thread partano, per non duplicare lock tenuti da altri thread
+        for attack in sorted(attacks, key=lambda name: name not in PROCESS_BOUND_ATTACKS):
+            pool = processes if attack in PROCESS_BOUND_ATTACKS else threads
+            for index in indices:
+                futures.append(pool.submit(_run_attack_job, provisioner, index,
+                                           attack, attack_kwargs.get(attack, {})))
+        # I risultati vengono scritti nel sink appena disponibili
+        results = []
+        for future in as_completed(futures):
+            results.append(future.result())
+            if sink is not None:
+                sink.write_attack(results[-1])
+
+    return {
+        'results': results,
+        'summary': aggregate_results(results),
+        'elapsed_s': time.perf_counter() - start_time
+    }
@@ -0,0 +1,193 @@
+import secrets
+import hmac
+import hashlib
+import struct
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+from cryptography.fernet import Fernet
+
+# Record della finestra serializzata: epoca (4 byte) e stato della catena (32 byte)
+_STATE_SIZE = 36
+
+class EpochVault:
+    """Vault con rotazione O(1): a ogni autenticazione avanza solo una catena HMAC.
+
+    Le chiavi dell'epoca e sono derivate su richiesta come
+    chiave_base[i] XOR HMAC(catena[e], i); le chiavi base non vengono mai ricifrate.
+    """
+    def __init__(self, n: int = 10, m: int = 128, cache_size: int = 0, history: int = 8):
+        self.n = n  # numero di chiavi
+        self.m = m  # dimensione chiave in bit
+        self.encryption_key = Fernet.generate_key()
+        self.fernet = Fernet(self.encryption_key)
+        self.keys = [self.fernet.encrypt(secrets.token_bytes(m // 8)) for _ in range(n)]
+        self._init_chain(0, self._initial_chain(), cache_size, history)
+
+    def _initial_chain(self) -> bytes:
+        return hmac.new(self.encryption_key, b'epoch-chain', hashlib.sha256).digest()
+
+    def _init_chain(self, epoch: int, chain: bytes, cache_size: int, history: int,
+                    previous: List[Tuple[int, bytes]] = ()):
+        if history < 1:
+            raise ValueError("history deve essere almeno 1")
+        self.epoch = epoch
+        self._chain = chain
+        # Ultimi `history` stati della catena (epoca, stato), nell'ordine in cui sono nati,
+        # per i dispositivi rimasti indietro
+        self.history = history
+        self._chains = deque(list(previous) + [(epoch, chain)], maxlen=history)
+        # Cache LRU delle chiavi base in chiaro (immutabili: mai invalidate)
+        self.cache_size = cache_size
+        self._key_cache: OrderedDict = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @classmethod
+    def from_material(cls, encryption_key: bytes, raw_keys: List[bytes], m: int = 128,
+                      cache_size: int = 0, history: int = 8) -> 'EpochVault':
+        vault = cls.__new__(cls)
+        vault.n = len(raw_keys)
+        vault.m = m
+        vault.encryption_key = encryption_key
+        vault.fernet = Fernet(encryption_key)
+        vault.keys = [vault.fernet.encrypt(key) for key in raw_keys]
+        vault._init_chain(0, vault._initial_chain(), cache_size, history)
+        return vault
+
+    def to_bytes(self) -> bytes:
+        # Formato: n, m, epoca, chiave di cifratura, finestra cifrata (history, stati
+        # presenti, poi `history` record epoca+stato a partire dal più vecchio, completati
+        # con zeri: dimensione fissa), token delle chiavi
+        window = [struct.pack('>HH', self.history, len(self._chains))]
+        window.extend(struct.pack('>I', epoch) + chain for epoch, chain in self._chains)
+        window.append(bytes(_STATE_SIZE * (self.history - len(self._chains))))
+        chain_token = self.fernet.encrypt(b''.join(window))
+        parts = [struct.pack('>HHIH', self.n, self.m, self.epoch, len(self.encryption_key)),
+                 self.encryption_key, struct.pack('>H', len(chain_token)), chain_token]
+        for token in self.keys:
+            parts.append(struct.pack('>H', len(token)))
+            parts.append(token)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, cache_size: int = 0) -> 'EpochVault':
+        vault = cls.__new__(cls)
+        vault.n, vault.m, epoch, key_len = struct.unpack_from('>HHIH', data)
+        offset = struct.calcsize('>HHIH')
+        vault.encryption_key = bytes(data[offset:offset + key_len])
+        vault.fernet = Fernet(vault.encryption_key)
+        offset += key_len
+        tokens = []
+        for _ in range(vault.n + 1):
+            (token_len,) = struct.unpack_from('>H', data, offset)
+            offset += 2
+            tokens.append(bytes(data[offset:offset + token_len]))
+            offset += token_len
+        vault.keys = tokens[1:]
+        window = vault.fernet.decrypt(tokens[0])
+        history, count = struct.unpack_from('>HH', window)
+        states = [(struct.unpack_from('>I', window, 4 + i * _STATE_SIZE)[0],
+                   window[8 + i * _STATE_SIZE:4 + (i + 1) * _STATE_SIZE])
+                  for i in range(count)]
+        vault._init_chain(*states[-1], cache_size, history, states[:-1])
+        return vault
+
+    def _base_key(self, index: int) -> bytes:
+        if not self.cache_size:
+            return self.fernet.decrypt(self.keys[index])
+        key = self._key_cache.get(index)
+        if key is not None:
+            self._key_cache.move_to_end(index)
+            self.cache_hits += 1
+            return key
+        self.cache_misses += 1
+        key = self.fernet.decrypt(self.keys[index])
+        self._key_cache[index] = key
+        if len(self._key_cache) > self.cache_size:
+            self._key_cache.popitem(last=False)
+        return key
+
+    def _chain_at(self, epoch: Optional[int]) -> bytes:
+        if epoch is None or epoch == self.epoch:
+            return self._chain
+        for chain_epoch, chain in reversed(self._chains):
+            if chain_epoch == epoch:
+                return chain
+        raise ValueError(f"Epoca {epoch} fuori dalla finestra di recupero")
+
+    def _state_keys(self, indices: List[int], epoch: int, chain: bytes) -> List[bytes]:
+        if epoch == 0:
+            return [self._base_key(i) for i in indices]
+        return [self._derive(chain, i, self._base_key(i)) for i in indices]
+
+    def _derive(self, chain: bytes, index: int, base_key: bytes) -> bytes:
+        # Pad per chiave; per chiavi oltre 256 bit si concatenano più blocchi HMAC
+        pad = b''
+        block = 0
+        while len(pad) < len(base_key):
+            pad += hmac.new(chain, struct.pack('>IH', index, block), hashlib.sha256).digest()
+            block += 1
+        return bytes(a ^ b for a, b in zip(base_key, pad))
+
+    def get_keys_by_indices(self, indices: List[int], epoch: int = None) -> List[bytes]:
+        # Costo proporzionale agli indici richiesti, non a n né al numero di rotazioni
+        epoch = self.epoch if epoch is None else epoch
+        return self._state_keys(indices, epoch, self._chain_at(epoch))
+
+    def cache_stats(self) -> dict:
+        return {
+            'epoch': self.epoch,
+            'size': len(self._key_cache),
+            'capacity': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'history': len(self._chains)
+        }
+
+    def generate_response(self, challenge: List[int], epoch: int = None) -> bytes:
+        return self._combine_keys(self.get_keys_by_indices(challenge, epoch))
+
+    def _combine_keys(self, challenge_keys: List[bytes]) -> bytes:
+        # Stessa combinazione di SecureVault: XOR delle chiavi, poi HMAC
+        response = challenge_keys[0]
+        for key in challenge_keys[1:]:
+            response = bytes(a ^ b for a, b in zip(response, key))
+        return hmac.new(self.encryption_key, response, hashlib.sha256).digest()
+
+    def update_vault(self, session_data: bytes):
+        # Rotazione: un solo HMAC, indipendente da n
+        self._rotate_from((self.epoch, self._chain), session_data)
+
+    def _rotate_from(self, state: Tuple[int, bytes], session_data: bytes):
+        # Il nuovo stato si aggiunge alla finestra senza rimuovere quelli più recenti
+        # dello stato di partenza: una risposta vecchia riprodotta non può riportare
+        # indietro il server e tagliare fuori il dispositivo legittimo
+        epoch, chain = state
+        self.epoch = epoch + 1
+        self._chain = hmac.new(chain, session_data, hashlib.sha256).digest()
+        self._chains.append((self.epoch, self._chain))
+
+    def matching_state(self, challenge: List[int],
+                       response: bytes) -> Optional[Tuple[int, bytes]]:
+        """Stato della finestra che genera la risposta, dal più recente al più vecchio"""
+        if response is None:
+            return None
+        for epoch, chain in reversed(self._chains):
+            expected = self._combine_keys(self._state_keys(challenge, epoch, chain))
+            if hmac.compare_digest(expected, response):
+                return epoch, chain
+        return None
+
+    def verify_and_rotate(self, items: List[Tuple[List[int], bytes, bytes]]) -> List[bool]:
+        """Verifica in ordine (challenge, risposta, dati di sessione) ruotando dopo ogni successo.
+
+        Un dispositivo rimasto indietro (conferma di rotazione persa) viene accettato se il
+        suo stato è nella finestra: il server ruota da quello stato, come il dispositivo.
+        """
+        results = []
+        for challenge, response, session_data in items:
+            state = self.matching_state(challenge, response)
+            if state is not None:
+                self._rotate_from(state, session_data)
+            results.append(state is not None)
+        return results
@@ -4,14 +4,65 @@ import hashlib
 from typing import List, Tuple
 from cryptography.fernet import Fernet
 import base64
+import struct
+from collections import OrderedDict
 
 class SecureVault:
-    def __init__(self, n: int = 10, m: int = 128):
+    def __init__(self, n: int = 10, m: int = 128, cache_size: int = 0):
         self.n = n  # numero di chiavi
         self.m = m  # dimensione chiave in bit
         self.encryption_key = Fernet.generate_key()
         self.fernet = Fernet(self.encryption_key)
         self.keys = self._generate_and_encrypt_keys()
+        self.epoch = 0  # incrementato a ogni update_vault
+        self._init_cache(cache_size)
+    
+    def _init_cache(self, cache_size: int):
+        # Cache LRU opzionale delle chiavi in chiaro (0 = disabilitata)
+        self.cache_size = cache_size
+        self._key_cache: OrderedDict = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    @classmethod
+    def from_material(cls, encryption_key: bytes, raw_keys: List[bytes],
+                      m: int = 128, cache_size: int = 0) -> 'SecureVault':
+        # Costruisce un vault da materiale già noto (es. derivato da un seed)
+        vault = cls.__new__(cls)
+        vault.n = len(raw_keys)
+        vault.m = m
+        vault.encryption_key = encryption_key
+        vault.fernet = Fernet(encryption_key)
+        vault.keys = [vault.fernet.encrypt(key) for key in raw_keys]
+        vault.epoch = 0
+        vault._init_cache(cache_size)
+        return vault
+    
+    def to_bytes(self) -> bytes:
+        # Formato: n, m, epoca, chiave di cifratura e token Fernet con prefisso di lunghezza
+        parts = [struct.pack('>HHIH', self.n, self.m, self.epoch, len(self.encryption_key)),
+                 self.encryption_key]
+        for token in self.keys:
+            parts.append(struct.pack('>H', len(token)))
+            parts.append(token)
+        return b''.join(parts)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes, cache_size: int = 0) -> 'SecureVault':
+        vault = cls.__new__(cls)
+        vault.n, vault.m, vault.epoch, key_len = struct.unpack_from('>HHIH', data)
+        offset = struct.calcsize('>HHIH')
+        vault.encryption_key = bytes(data[offset:offset + key_len])
+        vault.fernet = Fernet(vault.encryption_key)
+        offset += key_len
+        vault.keys = []
+        for _ in range(vault.n):
+            (token_len,) = struct.unpack_from('>H', data, offset)
+            offset += 2
+            vault.keys.append(bytes(data[offset:offset + token_len]))
+            offset += token_len
+        vault._init_cache(cache_size)
+        return vault
     
     def _generate_and_encrypt_keys(self) -> List[bytes]:
         raw_keys = [secrets.token_bytes(self.m // 8) for _ in range(self.n)]
@@ -21,12 +72,40 @@ class SecureVault:
         return self.fernet.decrypt(encrypted_key)
     
     def get_keys_by_indices(self, indices: List[int]) -> List[bytes]:
-        return [self.decrypt_key(self.keys[i]) for i in indices]
+        if not self.cache_size:
+            return [self.decrypt_key(self.keys[i]) for i in indices]
+        return [self._get_cached_key(i) for i in indices]
+    
+    def _get_cached_key(self, index: int) -> bytes:
+        entry = self._key_cache.get(index)
+        # Le voci di un'epoca precedente non sono mai valide
+        if entry is not None and entry[0] == self.epoch:
+            self._key_cache.move_to_end(index)
+            self.cache_hits += 1
+            return entry[1]
+        
+        self.cache_misses += 1
+        key = self.decrypt_key(self.keys[index])
+        self._key_cache[index] = (self.epoch, key)
+        self._key_cache.move_to_end(index)
+        if len(self._key_cache) > self.cache_size:
+            self._key_cache.popitem(last=False)
+        return key
+    
+    def cache_stats(self) -> dict:
+        return {
+            'epoch': self.epoch,
+            'size': len(self._key_cache),
+            'capacity': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses
+        }
     
     def generate_response(self, challenge: List[int]) -> bytes:
         # Ottiene le chiavi decifrate per gli indici della sfida
-        challenge_keys = self.get_keys_by_indices(challenge)
-        
+        return self._combine_keys(self.get_keys_by_indices(challenge))
+    
+    def _combine_keys(self, challenge_keys: List[bytes]) -> bytes:
         # Combina le chiavi usando XOR
         response = challenge_keys[0]
         for key in challenge_keys[1:]:
@@ -36,15 +115,44 @@ class SecureVault:
         h = hmac.new(self.encryption_key, response, hashlib.sha256)
         return h.digest()
     
-    def update_vault(self, session_data: bytes):
+    def _rotate_keys(self, raw_keys: List[bytes], session_data: bytes) -> List[bytes]:
         # Genera HMAC dei dati di sessione
         h = hmac.new(self.encryption_key, session_data, hashlib.sha256)
         hmac_value = h.digest()
         
         # Aggiorna le chiavi usando XOR con HMAC
-        for i in range(self.n):
-            decrypted_key = self.decrypt_key(self.keys[i])
+        updated_keys = []
+        for i, decrypted_key in enumerate(raw_keys):
             start = (i * len(hmac_value)) % len(hmac_value)
-            updated_key = bytes(a ^ b for a, b in zip(decrypted_key, 
-                              hmac_value[start:start + len(decrypted_key)]))
-            self.keys[i] = self.fernet.encrypt(updated_key) 
\ No newline at end of file
+            updated_keys.append(bytes(a ^ b for a, b in zip(decrypted_key, 
+                                hmac_value[start:start + len(decrypted_key)])))
+        return updated_keys
+    
+    def update_vault(self, session_data: bytes):
+        # Nuova epoca: nessuna chiave in chiaro sopravvive alla rotazione
+        self.epoch += 1
+        self._key_cache.clear()
+        
+        raw_keys = [self.decrypt_key(key) for key in self.keys]
+        self.keys = [self.fernet.encrypt(key)
+                     for key in self._rotate_keys(raw_keys, session_data)]
+    
+    def verify_and_rotate(self, items: List[Tuple[List[int], bytes, bytes]]) -> List[bool]:
+        """Verifica in ordine (challenge, risposta, dati di sessione) decifrando il vault una volta"""
+        raw_keys = [self.decrypt_key(key) for key in self.keys]
+        results = []
+        rotations = 0
+        for challenge, response, session_data in items:
+            expected = self._combine_keys([raw_keys[i] for i in challenge])
+            ok = response is not None and hmac.compare_digest(expected, response)
+            if ok:
+                # Ogni verifica riuscita ruota le chiavi per le risposte successive
+                raw_keys = self._rotate_keys(raw_keys, session_data)
+                rotations += 1
+            results.append(ok)
+        
+        if rotations:
+            self.epoch += rotations
+            self._key_cache.clear()
+            self.keys = [self.fernet.encrypt(key) for key in raw_keys]
+        return results
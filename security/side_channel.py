@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from typing import Sequence
+import numpy as np
+from src.device.iot_device import SimulatedIoTDevice
+
+# Peso di Hamming di ogni byte, per il modello di leakage
+HAMMING_WEIGHT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Livello di utilizzo CPU nelle tre fasi osservate (come in simulate_power_consumption)
+PHASE_CPU_USAGE = (0.0, 0.2, 0.4)
+
+@dataclass
+class TraceSet:
+    traces: np.ndarray          # potenza in mW, forma (tracce, campioni)
+    fixed: np.ndarray           # True se la traccia usa la challenge fissa (TVLA)
+    intermediates: np.ndarray   # XOR delle chiavi sfidate, forma (tracce, m/8)
+    device_index: np.ndarray    # dispositivo che ha prodotto ogni traccia
+
+def capture_power_traces(devices: Sequence[SimulatedIoTDevice], num_traces: int,
+                         samples_per_phase: int = 16, leakage_ma_per_bit: float = 0.05,
+                         noise_ma: float = 0.5, fixed_challenge: Sequence[int] = (0, 1, 2),
+                         seed: int = None) -> TraceSet:
+    """Acquisisce tracce di potenza in una matrice preallocata (tracce x campioni)"""
+    rng = np.random.default_rng(seed)
+    num_samples = len(PHASE_CPU_USAGE) * samples_per_phase
+    traces = np.empty((num_traces, num_samples), dtype=np.float32)
+    fixed = rng.random(num_traces) < 0.5
+    device_index = np.arange(num_traces) % len(devices)
+
+    key_len = devices[0].vault.m // 8
+    intermediates = np.empty((num_traces, key_len), dtype=np.uint8)
+    for d, device in enumerate(devices):
+        rows = np.flatnonzero(device_index == d)
+        if not rows.size:
+            continue
+        # Il modello fisico "vede" le chiavi in chiaro: un'unica decifratura per dispositivo
+        vault = device.vault
+        keys = np.frombuffer(b''.join(vault.get_keys_by_indices(range(vault.n))),
+                             dtype=np.uint8).reshape(vault.n, key_len)
+        challenges = rng.integers(0, vault.n, size=(rows.size, len(fixed_challenge)))
+        challenges[fixed[rows]] = fixed_challenge
+        intermediates[rows] = np.bitwise_xor.reduce(keys[challenges], axis=1)
+
+    specs = devices[0].specs
+    # Corrente di base per fase, poi leakage proporzionale al peso di Hamming
+    # dei byte intermedi durante la generazione della risposta
+    for phase, cpu_usage in enumerate(PHASE_CPU_USAGE):
+        current = specs.base_current_ma + (specs.peak_current_ma - specs.base_current_ma) * cpu_usage
+        traces[:, phase * samples_per_phase:(phase + 1) * samples_per_phase] = current
+    start = (len(PHASE_CPU_USAGE) - 1) * samples_per_phase
+    leaky = min(samples_per_phase, key_len)
+    traces[:, start:start + leaky] += leakage_ma_per_bit * HAMMING_WEIGHT[intermediates[:, :leaky]]
+    traces += rng.normal(0.0, noise_ma, size=traces.shape).astype(np.float32)
+    traces *= specs.voltage_v
+    return TraceSet(traces, fixed, intermediates, device_index)
+
+# Righe elaborate per blocco: i temporanei restano di pochi MB qualunque sia il numero di tracce
+TRACE_CHUNK_ROWS = 16384
+
+def _trace_moments(traces: np.ndarray, group: np.ndarray = None, hypotheses: np.ndarray = None,
+                   chunk_rows: int = TRACE_CHUNK_ROWS) -> dict:
+    """Somme e somme dei quadrati per campione in una sola passata a blocchi di righe.
+
+    I blocchi sono in float32 e traslati sulla prima riga (stabilità numerica), gli
+    accumulatori in float64; il gruppo e le ipotesi entrano come pesi, senza copie
+    delle righe selezionate.
+    """
+    shift = traces[0].astype(np.float32)
+    moments = {'n': len(traces), 'sum': 0.0, 'sq': 0.0}
+    if group is not None:
+        moments.update(n_group=int(np.count_nonzero(group)), sum_group=0.0, sq_group=0.0)
+    if hypotheses is not None:
+        h_shift = hypotheses[0].astype(np.float32)
+        moments.update(sum_h=0.0, sq_h=0.0, cross=0.0)
+    for begin in range(0, len(traces), chunk_rows):
+        rows = slice(begin, begin + chunk_rows)
+        x = np.subtract(traces[rows], shift, dtype=np.float32)
+        sq = x * x
+        moments['sum'] += x.sum(axis=0, dtype=np.float64)
+        moments['sq'] += sq.sum(axis=0, dtype=np.float64)
+        if group is not None:
+            weights = group[rows].astype(np.float32)
+            moments['sum_group'] += (weights @ x).astype(np.float64)
+            moments['sq_group'] += (weights @ sq).astype(np.float64)
+        if hypotheses is not None:
+            h = np.subtract(hypotheses[rows], h_shift, dtype=np.float32)
+            moments['sum_h'] += h.sum(axis=0, dtype=np.float64)
+            moments['sq_h'] += (h * h).sum(axis=0, dtype=np.float64)
+            moments['cross'] += (h.T @ x).astype(np.float64)
+    return moments
+
+def _welch_from_moments(moments: dict) -> np.ndarray:
+    n_a = moments['n_group']
+    n_b = moments['n'] - n_a
+    sum_a, sq_a = moments['sum_group'], moments['sq_group']
+    sum_b, sq_b = moments['sum'] - sum_a, moments['sq'] - sq_a
+    mean_a, mean_b = sum_a / n_a, sum_b / n_b
+    var_a = np.maximum(sq_a - sum_a * mean_a, 0.0) / (n_a - 1)
+    var_b = np.maximum(sq_b - sum_b * mean_b, 0.0) / (n_b - 1)
+    denom = np.sqrt(var_a / n_a + var_b / n_b)
+    return np.divide(mean_a - mean_b, denom, out=np.zeros_like(denom), where=denom > 0)
+
+def _correlation_from_moments(moments: dict) -> np.ndarray:
+    n = moments['n']
+    cov = moments['cross'] - np.outer(moments['sum_h'], moments['sum']) / n
+    var_h = np.maximum(moments['sq_h'] - moments['sum_h'] ** 2 / n, 0.0)
+    var_t = np.maximum(moments['sq'] - moments['sum'] ** 2 / n, 0.0)
+    norm = np.sqrt(np.outer(var_h, var_t))
+    return np.divide(cov, norm, out=np.zeros_like(cov), where=norm > 0)
+
+def welch_t_test(traces: np.ndarray, group: np.ndarray,
+                 chunk_rows: int = TRACE_CHUNK_ROWS) -> np.ndarray:
+    """t di Welch per ogni campione tra i due gruppi (TVLA fixed-vs-random)"""
+    return _welch_from_moments(_trace_moments(traces, group=group, chunk_rows=chunk_rows))
+
+def correlation_matrix(traces: np.ndarray, hypotheses: np.ndarray,
+                       chunk_rows: int = TRACE_CHUNK_ROWS) -> np.ndarray:
+    """Correlazione di Pearson (CPA) tra ogni ipotesi e ogni campione: forma (ipotesi, campioni)"""
+    return _correlation_from_moments(_trace_moments(traces, hypotheses=hypotheses,
+                                                    chunk_rows=chunk_rows))
+
+def assess_leakage(trace_set: TraceSet, t_threshold: float = 4.5) -> dict:
+    traces = trace_set.traces
+    # Ipotesi: peso di Hamming di ciascun byte intermedio (modello noto al valutatore);
+    # t-test e correlazione condividono un'unica passata sulle tracce
+    hypotheses = HAMMING_WEIGHT[trace_set.intermediates]
+    moments = _trace_moments(traces, group=trace_set.fixed, hypotheses=hypotheses)
+    t_values = _welch_from_moments(moments)
+    rho = _correlation_from_moments(moments)
+    # Soglia di significatività della correlazione, analoga a |t| > 4.5
+    rho_threshold = t_threshold / np.sqrt(len(traces))
+    leaky_samples = np.abs(t_values) > t_threshold
+    return {
+        'traces': len(traces),
+        'samples': traces.shape[1],
+        'leaky_samples': int(leaky_samples.sum()),
+        'max_abs_t': float(np.abs(t_values).max()),
+        'max_abs_correlation': float(np.abs(rho).max()),
+        'correlated_bytes': int((np.abs(rho).max(axis=1) > rho_threshold).sum())
+    }
@@ -0,0 +1,303 @@
+import bisect
+import hashlib
+import multiprocessing
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.security.auth_protocol import AuthenticationMessage
+from src.server.device_registry import deserialize_vault, serialize_vault
+from src.server.iot_server import IoTServer
+from src.server.rate_limiter import AuthRateLimiter, RateLimitExceeded
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+class ConsistentHashRing:
+    """Anello di hashing consistente con nodi virtuali"""
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node: str):
+        if node in self.nodes:
+            raise ValueError(f"Nodo già presente: {node}")
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            point = _hash64(f"{node}#{replica}")
+            position = bisect.bisect(self._points, point)
+            self._points.insert(position, point)
+            self._owners.insert(position, node)
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise ValueError("Anello vuoto")
+        position = bisect.bisect(self._points, _hash64(key)) % len(self._points)
+        return self._owners[position]
+
+def _encode(msg: AuthenticationMessage) -> bytes:
+    # Sulla pipe viaggia il formato binario del protocollo (le viste memoryview non si serializzano)
+    return msg.to_bytes()
+
+def _shard_main(conn, server_kwargs: dict):
+    """Ciclo di un worker: un IoTServer privato che risponde alle richieste del router"""
+    server = IoTServer(**server_kwargs)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        op, args = request
+        try:
+            if op == 'close':
+                server.close()
+                conn.send(('ok', None))
+                break
+            elif op == 'phase1':
+                messages, source = args
+                replies = server.handle_auth_phase1_many(
+                    [AuthenticationMessage.from_bytes(data) for data in messages], source
+                )
+                result = [_encode(reply) for reply in replies]
+            elif op == 'verify':
+                result = server.verify_responses(
+                    [AuthenticationMessage.from_bytes(data) for data in args]
+                )
+            elif op == 'register':
+                server.register_devices((device_id, deserialize_vault(blob))
+                                        for device_id, blob in args)
+                result = None
+            elif op == 'export':
+                # Consegna stato e sessioni aperte dei dispositivi non più posseduti
+                nodes, vnodes, name = args
+                ring = ConsistentHashRing(nodes, vnodes)
+                result = []
+                for device_id in list(server.devices.materialized_ids()):
+                    if ring.node_for(device_id) != name:
+                        result.append((device_id, server.devices.remove(device_id),
+                                       server.active_sessions.pop_device(device_id)))
+            elif op == 'import':
+                for device_id, blob, sessions in args:
+                    if blob is not None:
+                        server.register_device(device_id, deserialize_vault(blob))
+                    for session_id, data in sessions.items():
+                        server.active_sessions.add(session_id, data)
+                result = None
+            elif op == 'stats':
+                result = {
+                    'devices': server.devices.stats(),
+                    'sessions': server.active_sessions.stats(),
+                    'verified_ok': server.verified_ok,
+                    'verified_failed': server.verified_failed
+                }
+            else:
+                raise ValueError(f"Operazione sconosciuta: {op}")
+            conn.send(('ok', result))
+        except Exception as exc:
+            conn.send(('error', exc))
+    conn.close()
+
+class _Shard:
+    def __init__(self, name: str, server_kwargs: dict):
+        self.name = name
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_shard_main, args=(child_conn, server_kwargs),
+                                               name=f"iot-shard-{name}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        # Una richiesta alla volta per pipe, anche con più thread chiamanti
+        self.lock = threading.Lock()
+
+    def send(self, op: str, args=None):
+        # Il lock resta acquisito fino a receive(); se l'invio fallisce viene rilasciato subito
+        self.lock.acquire()
+        try:
+            self.conn.send((op, args))
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def receive(self):
+        try:
+            status, result = self.conn.recv()
+        finally:
+            self.lock.release()
+        if status == 'error':
+            raise result
+        return result
+
+    def call(self, op: str, args=None):
+        self.send(op, args)
+        return self.receive()
+
+class _ClusterSessions:
+    """Vista aggregata delle sessioni dei shard (len e stats come SessionStore)"""
+    def __init__(self, cluster: 'IoTServerCluster'):
+        self.cluster = cluster
+
+    def stats(self) -> dict:
+        totals: Dict[str, int] = {}
+        for shard_stats in self.cluster._broadcast('stats'):
+            for key, value in shard_stats['sessions'].items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def __len__(self) -> int:
+        return self.stats().get('active', 0)
+
+class IoTServerCluster:
+    """Router locale verso più processi IoTServer, ognuno proprietario di una fetta di device_id"""
+    def __init__(self, num_shards: int = None, vnodes: int = 64, db_path: str = ':memory:',
+                 rate_limiter: Optional[AuthRateLimiter] = None, **server_kwargs):
+        if 'clock' in server_kwargs:
+            # Ogni shard vive in un processo separato: un clock simulato non è condivisibile
+            raise ValueError("Il cluster usa il clock di sistema in ogni shard")
+        num_shards = num_shards or os.cpu_count() or 1
+        if num_shards < 1:
+            raise ValueError("Il cluster richiede almeno uno shard")
+        self.vnodes = vnodes
+        self.db_path = db_path
+        self.server_kwargs = server_kwargs
+        self.ring = ConsistentHashRing(vnodes=vnodes)
+        self.shards: Dict[str, _Shard] = {}
+        self.active_sessions = _ClusterSessions(self)
+        # Il rate limiter è applicato dal router: le richieste respinte non arrivano agli shard
+        self.rate_limiter = rate_limiter
+        for _ in range(num_shards):
+            self._start_shard()
+
+    def _start_shard(self) -> str:
+        name = f"shard{len(self.shards)}"
+        kwargs = dict(self.server_kwargs)
+        # Un database distinto per shard, come nodi separati
+        kwargs['db_path'] = self.db_path if self.db_path == ':memory:' else f"{self.db_path}.{name}"
+        self.shards[name] = _Shard(name, kwargs)
+        self.ring.add_node(name)
+        return name
+
+    def shard_for(self, device_id: str) -> str:
+        return self.ring.node_for(device_id)
+
+    def _broadcast(self, op: str, args=None) -> List:
+        # Prima si inviano tutte le richieste, poi si raccolgono: gli shard lavorano in parallelo
+        shards = list(self.shards.values())
+        return self._gather(shards, [(op, args)] * len(shards))
+
+    def _scatter(self, op: str, groups: Dict[str, list], extra=None) -> Dict[str, object]:
+        shards = [self.shards[name] for name in groups]
+        requests = [(op, (items, extra) if op == 'phase1' else items) for items in groups.values()]
+        return dict(zip(groups, self._gather(shards, requests)))
+
+    @staticmethod
+    def _gather(shards: List[_Shard], requests: List[tuple]) -> List:
+        # Si leggono tutte le risposte prima di propagare un errore: una risposta non letta
+        # lascerebbe lo shard bloccato e la sua pipe fuori sincronia
+        sent = []
+        error = None
+        try:
+            for shard, (op, args) in zip(shards, requests):
+                shard.send(op, args)
+                sent.append(shard)
+        finally:
+            results = []
+            for shard in sent:
+                try:
+                    results.append(shard.receive())
+                except Exception as exc:
+                    results.append(None)
+                    error = error or exc
+        if error is not None:
+            raise error
+        return results
+
+    def _group(self, items, key) -> Dict[str, list]:
+        groups: Dict[str, list] = {}
+        for item in items:
+            groups.setdefault(self.shard_for(key(item)), []).append(item)
+        return groups
+
+    def register_device(self, device_id: str, vault):
+        self.shards[self.shard_for(device_id)].call('register', [(device_id, serialize_vault(vault))])
+
+    def register_devices(self, devices: Iterable[Tuple[str, object]], batch_size: int = 10000):
+        batch = []
+        for device_id, vault in devices:
+            batch.append((device_id, serialize_vault(vault)))
+            if len(batch) >= batch_size:
+                self._scatter('register', self._group(batch, lambda item: item[0]))
+                batch = []
+        if batch:
+            self._scatter('register', self._group(batch, lambda item: item[0]))
+
+    def handle_auth_phase1(self, msg: AuthenticationMessage,
+                           source: str = None) -> AuthenticationMessage:
+        return self.handle_auth_phase1_many([msg], source)[0]
+
+    def handle_auth_phase1_many(self, messages: List[AuthenticationMessage],
+                                source: str = None) -> List[AuthenticationMessage]:
+        if self.rate_limiter is not None:
+            for msg in messages:
+                if not self.rate_limiter.allow(msg.device_id, source):
+                    raise RateLimitExceeded("Troppe richieste di autenticazione")
+        # Le risposte tornano nell'ordine dei messaggi ricevuti
+        groups = self._group(range(len(messages)), lambda i: messages[i].device_id)
+        encoded = {name: [_encode(messages[i]) for i in indices] for name, indices in groups.items()}
+        replies = self._scatter('phase1', encoded, source)
+        result: List[Optional[AuthenticationMessage]] = [None] * len(messages)
+        for name, indices in groups.items():
+            for i, data in zip(indices, replies[name]):
+                result[i] = AuthenticationMessage.from_bytes(data)
+        return result
+
+    def handle_auth_phase2(self, msg: AuthenticationMessage) -> bool:
+        return self.verify_responses([msg])[msg.session_id]
+
+    def verify_responses(self, messages: List[AuthenticationMessage]) -> Dict[str, bool]:
+        groups = self._group(messages, lambda msg: msg.device_id)
+        results: Dict[str, bool] = {}
+        for shard_results in self._scatter(
+                'verify', {name: [_encode(msg) for msg in msgs] for name, msgs in groups.items()}
+        ).values():
+            results.update(shard_results)
+        return results
+
+    def add_shard(self) -> Dict[str, int]:
+        """Aggiunge uno shard e gli trasferisce i dispositivi che ora gli appartengono"""
+        name = self._start_shard()
+        moved = []
+        for exported in self._export_all(list(self.ring.nodes), exclude=name):
+            moved.extend(exported)
+        if moved:
+            self.shards[name].call('import', moved)
+        return {'shard': name, 'moved_devices': len(moved),
+                'moved_sessions': sum(len(sessions) for _, _, sessions in moved)}
+
+    def _export_all(self, nodes: List[str], exclude: str) -> List[list]:
+        # Ogni shard esistente calcola in parallelo cosa cedere secondo il nuovo anello
+        shards = [shard for shard_name, shard in self.shards.items() if shard_name != exclude]
+        return self._gather(shards, [('export', (nodes, self.vnodes, shard.name))
+                                     for shard in shards])
+
+    def stats(self) -> Dict[str, dict]:
+        return dict(zip(self.shards, self._broadcast('stats')))
+
+    def close(self):
+        for shard in self.shards.values():
+            if shard.process.is_alive():
+                try:
+                    shard.call('close')
+                except (EOFError, OSError):
+                    pass
+            shard.process.join(timeout=5)
+            shard.conn.close()
+        self.shards.clear()
+
+    def __enter__(self) -> 'IoTServerCluster':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,198 @@
+import sqlite3
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+from src.security.secure_vault import SecureVault
+from src.security.array_vault import ArrayVault
+from src.security.epoch_vault import EpochVault
+
+# Tag di un byte che precede i dati serializzati per distinguere i backend del vault
+VAULT_TYPES = {b'S': SecureVault, b'A': ArrayVault, b'E': EpochVault}
+VAULT_TAGS = {cls: tag for tag, cls in VAULT_TYPES.items()}
+
+def serialize_vault(vault) -> bytes:
+    return VAULT_TAGS[type(vault)] + vault.to_bytes()
+
+def deserialize_vault(data: bytes):
+    return VAULT_TYPES[bytes(data[:1])].from_bytes(memoryview(data)[1:])
+
+class DeviceRegistry:
+    """Registro dei dispositivi su SQLite con un hot set LRU di vault in memoria"""
+    # Query costanti: sqlite3 riusa lo statement preparato dalla propria cache
+    _SELECT_VAULT = 'SELECT vault_data FROM devices WHERE device_id = ?'
+    _EXISTS = 'SELECT 1 FROM devices WHERE device_id = ?'
+    _UPSERT = 'INSERT OR REPLACE INTO devices (device_id, vault_data) VALUES (?, ?)'
+
+    def __init__(self, db: sqlite3.Connection, hot_set_size: Optional[int] = None,
+                 provisioner=None):
+        self.db = db
+        # None = nessun limite: tutti i vault usati restano in memoria
+        self.hot_set_size = hot_set_size
+        # Flotta con vault derivati da seed: nessuna riga finché il vault non cambia
+        self.provisioner = provisioner
+        self._provisioned_stored = set()
+        self._hot: OrderedDict = OrderedDict()
+        # Vault dell'hot set ruotati dopo l'ultima scrittura su database
+        self._dirty = set()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, device_id: str, vault):
+        # Il server conserva una propria copia: il vault viene letto dal database al primo uso
+        self._store(device_id, vault)
+        self._hot.pop(device_id, None)
+
+    def register_many(self, items: Iterable[Tuple[str, object]], batch_size: int = 10000):
+        # Inserimenti in blocco, una transazione per batch
+        batch = []
+        for device_id, vault in items:
+            batch.append((device_id, serialize_vault(vault)))
+            self._hot.pop(device_id, None)
+            if len(batch) >= batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        with self.db:
+            self.db.executemany(self._UPSERT, batch)
+        self._track_provisioned(device_id for device_id, _ in batch)
+
+    def _store(self, device_id: str, vault):
+        with self.db:
+            self.db.execute(self._UPSERT, (device_id, serialize_vault(vault)))
+        self._track_provisioned((device_id,))
+
+    def _track_provisioned(self, device_ids):
+        if self.provisioner is not None:
+            for device_id in device_ids:
+                if self.provisioner.index_of(device_id) is not None:
+                    self._provisioned_stored.add(device_id)
+
+    def get(self, device_id: str, default=None):
+        vault = self._hot.get(device_id)
+        if vault is not None:
+            self._hot.move_to_end(device_id)
+            self.hits += 1
+            return vault
+
+        row = self.db.execute(self._SELECT_VAULT, (device_id,)).fetchone()
+        if row is not None:
+            vault = deserialize_vault(row[0])
+        elif self.provisioner is not None:
+            vault = self.provisioner.vault_for(device_id)
+        else:
+            vault = None
+        if vault is None:
+            return default
+        self.loads += 1
+        self._remember(device_id, vault)
+        return vault
+
+    def persist(self, device_id: str):
+        # Scrive su disco lo stato corrente di un vault presente nell'hot set
+        vault = self._hot.get(device_id)
+        if vault is not None:
+            self._store(device_id, vault)
+        self._dirty.discard(device_id)
+
+    def mark_dirty(self, device_id: str):
+        # Il vault in memoria è cambiato (rotazione): va riscritto prima di perderlo
+        if device_id in self._hot:
+            self._dirty.add(device_id)
+
+    @property
+    def dirty_count(self) -> int:
+        # Vault ruotati in attesa di essere scritti
+        return len(self._dirty)
+
+    def flush(self):
+        """Scrive in una sola transazione tutti i vault ruotati ancora nell'hot set"""
+        if self._dirty:
+            self._write_batch([(device_id, serialize_vault(self._hot[device_id]))
+                               for device_id in self._dirty if device_id in self._hot])
+            self._dirty.clear()
+
+    def remove(self, device_id: str) -> Optional[bytes]:
+        """Rimuove il dispositivo e ne restituisce lo stato serializzato (per la migrazione)"""
+        vault = self._hot.pop(device_id, None)
+        self._dirty.discard(device_id)
+        row = self.db.execute(self._SELECT_VAULT, (device_id,)).fetchone()
+        if row is not None:
+            with self.db:
+                self.db.execute('DELETE FROM devices WHERE device_id = ?', (device_id,))
+        self._provisioned_stored.discard(device_id)
+        if vault is not None:
+            return serialize_vault(vault)
+        return bytes(row[0]) if row is not None else None
+
+    def materialized_ids(self) -> Iterator[str]:
+        # Dispositivi con stato proprio (hot set o database), esclusi quelli solo derivabili
+        seen = set(self._hot)
+        yield from list(seen)
+        for (device_id,) in self.db.execute('SELECT device_id FROM devices').fetchall():
+            if device_id not in seen:
+                yield device_id
+
+    def _remember(self, device_id: str, vault):
+        self._hot[device_id] = vault
+        self._hot.move_to_end(device_id)
+        if self.hot_set_size is not None:
+            evicted = []
+            while len(self._hot) > self.hot_set_size:
+                # Solo un vault ruotato va salvato prima di scartarlo: gli altri sono
+                # identici alla riga su database (o derivabili dal seed)
+                old_id, old_vault = self._hot.popitem(last=False)
+                if old_id in self._dirty:
+                    self._dirty.discard(old_id)
+                    evicted.append((old_id, serialize_vault(old_vault)))
+                self.evictions += 1
+            if evicted:
+                self._write_batch(evicted)
+
+    def hot_vaults(self):
+        # Vault attualmente in memoria, dal meno al più recentemente usato
+        return self._hot.values()
+
+    def stats(self) -> dict:
+        return {
+            'registered': len(self),
+            'hot_set': len(self._hot),
+            'dirty': len(self._dirty),
+            'hits': self.hits,
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
+
+    # Interfaccia di tipo dict, compatibile con l'uso precedente di IoTServer.devices
+    def __contains__(self, device_id: str) -> bool:
+        if device_id in self._hot:
+            return True
+        if self.provisioner is not None and self.provisioner.index_of(device_id) is not None:
+            return True
+        return self.db.execute(self._EXISTS, (device_id,)).fetchone() is not None
+
+    def __getitem__(self, device_id: str):
+        vault = self.get(device_id)
+        if vault is None:
+            raise KeyError(device_id)
+        return vault
+
+    def __setitem__(self, device_id: str, vault):
+        self.register(device_id, vault)
+
+    def __len__(self) -> int:
+        stored = self.db.execute('SELECT COUNT(*) FROM devices').fetchone()[0]
+        if self.provisioner is None:
+            return stored
+        return stored + self.provisioner.num_devices - len(self._provisioned_stored)
+
+    def __iter__(self) -> Iterator[str]:
+        for (device_id,) in self.db.execute('SELECT device_id FROM devices'):
+            if device_id not in self._provisioned_stored:
+                yield device_id
+        if self.provisioner is not None:
+            start = self.provisioner.device_offset
+            for index in range(start, start + self.provisioner.num_devices):
+                yield self.provisioner.device_id(index)
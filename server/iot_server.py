@@ -1,34 +1,88 @@
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Iterable, Optional, Tuple, List
 import sqlite3
 from src.security.secure_vault import SecureVault
 from src.security.auth_protocol import AuthenticationMessage, AuthState
+from src.server.device_registry import DeviceRegistry
+from src.server.session_store import SessionStore
+from src.server.rate_limiter import AuthRateLimiter, RateLimitExceeded
 import secrets
 
 class IoTServer:
-    def __init__(self):
-        self.active_sessions: Dict[str, dict] = {}
-        self.devices: Dict[str, SecureVault] = {}
+    def __init__(self, db_path: str = ':memory:', hot_set_size: Optional[int] = None,
+                 session_ttl_ms: float = 30000,
+                 max_sessions_per_device: Optional[int] = 8,
+                 max_sessions: Optional[int] = None,
+                 clock: Callable[[], float] = None,
+                 provisioner=None,
+                 rate_limiter: Optional[AuthRateLimiter] = None,
+                 flush_every: int = 1024, flush_interval_ms: float = 1000.0):
+        # Le sessioni semiaperte scadono dopo session_ttl_ms (clock in ms, es. VirtualClock)
+        session_kwargs = {'clock': clock} if clock is not None else {}
+        self.active_sessions = SessionStore(
+            ttl_ms=session_ttl_ms,
+            max_sessions_per_device=max_sessions_per_device,
+            max_sessions=max_sessions,
+            **session_kwargs
+        )
+        # Rate limiter opzionale per dispositivo e per sorgente (protezione DoS)
+        self.rate_limiter = rate_limiter
+        self.verified_ok = 0
+        self.verified_failed = 0
+        self.db_path = db_path
         self.db = self._init_database()
+        # Registro persistente: i vault vengono caricati dal database solo quando servono
+        # Con un FleetProvisioner i vault mancanti vengono derivati dal seed
+        self.devices = DeviceRegistry(self.db, hot_set_size, provisioner)
+        # Su file i vault ruotati vengono riscritti in blocco quando ne sono in attesa
+        # flush_every o sono passati flush_interval_ms dall'ultima scrittura; quelli
+        # espulsi dall'hot set vengono scritti subito, gli altri in close()
+        self.persist_rotations = db_path != ':memory:'
+        self.flush_every = flush_every
+        self.flush_interval_ms = flush_interval_ms
+        self._last_flush_ms = self.active_sessions.clock()
         
     def _init_database(self):
-        db = sqlite3.connect(':memory:')
+        db = sqlite3.connect(self.db_path, cached_statements=256)
         cur = db.cursor()
+        if self.db_path != ':memory:':
+            # WAL: letture concorrenti e scritture in blocco più veloci su file
+            cur.execute('PRAGMA journal_mode=WAL')
+            cur.execute('PRAGMA synchronous=NORMAL')
         cur.execute('''
-            CREATE TABLE devices
+            CREATE TABLE IF NOT EXISTS devices
             (device_id TEXT PRIMARY KEY, vault_data BLOB)
         ''')
         return db
     
-    def _generate_challenge(self) -> Tuple[List[int], bytes]:
-        indices = [secrets.randbelow(10) for _ in range(3)]  # usando n=10 come default
+    def close(self):
+        # Salva i vault ruotati non ancora scritti e chiude il database
+        self.devices.flush()
+        self.db.close()
+        
+    def register_device(self, device_id: str, vault: SecureVault):
+        self.devices.register(device_id, vault)
+        
+    def register_devices(self, devices: Iterable[Tuple[str, SecureVault]],
+                         batch_size: int = 10000):
+        self.devices.register_many(devices, batch_size)
+    
+    def _generate_challenge(self, n: int = 10) -> Tuple[List[int], bytes]:
+        indices = [secrets.randbelow(n) for _ in range(3)]  # n = dimensione del vault
         random_number = secrets.token_bytes(16)
         return indices, random_number
         
-    def handle_auth_phase1(self, msg: AuthenticationMessage) -> AuthenticationMessage:
-        if msg.device_id not in self.devices:
+    def handle_auth_phase1(self, msg: AuthenticationMessage,
+                           source: str = None) -> AuthenticationMessage:
+        # Il rate limiter precede ogni lavoro costoso (lookup del vault, challenge)
+        if self.rate_limiter is not None and not self.rate_limiter.allow(msg.device_id, source):
+            raise RateLimitExceeded("Troppe richieste di autenticazione")
+        
+        # Il lookup carica il vault nell'hot set se non è già in memoria
+        vault = self.devices.get(msg.device_id)
+        if vault is None:
             raise ValueError("Dispositivo non autorizzato")
         
-        challenge_indices, random_number = self._generate_challenge()
+        challenge_indices, random_number = self._generate_challenge(vault.n)
         session_data = {
             'device_id': msg.device_id,
             'state': AuthState.CHALLENGE_SENT,
@@ -44,13 +98,17 @@ class IoTServer:
             random_number=random_number
         )
 
+    def handle_auth_phase1_many(self, messages: List[AuthenticationMessage],
+                                source: str = None) -> List[AuthenticationMessage]:
+        return [self.handle_auth_phase1(msg, source) for msg in messages]
+
     def handle_auth_request(self, device_id: str, 
                            message: AuthenticationMessage) -> AuthenticationMessage:
         if device_id not in self.devices:
             raise ValueError("Dispositivo non autorizzato")
             
         vault = self.devices[device_id]
-        challenge_indices, random_number = self._generate_challenge()
+        challenge_indices, random_number = self._generate_challenge(vault.n)
         
         self.active_sessions[message.session_id] = {
             'device_id': device_id,
@@ -62,4 +120,52 @@ class IoTServer:
             session_id=message.session_id,
             challenge=challenge_indices,
             random_number=random_number
-        ) 
\ No newline at end of file
+        )
+        
+    def handle_auth_phase2(self, msg: AuthenticationMessage) -> bool:
+        """Verifica la risposta del dispositivo e ruota la copia del vault sul server"""
+        return self.verify_responses([msg])[msg.session_id]
+        
+    def verify_responses(self, messages: List[AuthenticationMessage]) -> Dict[str, bool]:
+        """Verifica un blocco di risposte raggruppandole per dispositivo"""
+        results: Dict[str, bool] = {}
+        pending: Dict[str, List[Tuple[str, dict, AuthenticationMessage]]] = {}
+        
+        for msg in messages:
+            session = self.active_sessions.complete(msg.session_id)
+            # Sessioni sconosciute, scadute o di un altro dispositivo sono rifiutate subito
+            if (session is None or session.get('device_id') != msg.device_id
+                    or session.get('state') != AuthState.CHALLENGE_SENT):
+                results[msg.session_id] = False
+                continue
+            pending.setdefault(msg.device_id, []).append((msg.session_id, session, msg))
+        
+        for device_id, entries in pending.items():
+            vault = self.devices.get(device_id)
+            if vault is None:
+                outcomes = [False] * len(entries)
+            else:
+                # Le chiavi del vault vengono decifrate una sola volta per dispositivo
+                outcomes = vault.verify_and_rotate([
+                    (session['challenge'], msg.response, session_id.encode())
+                    for session_id, session, msg in entries
+                ])
+            for (session_id, session, _), ok in zip(entries, outcomes):
+                session['state'] = AuthState.AUTHENTICATED if ok else AuthState.FAILED
+                results[session_id] = ok
+            if any(outcomes):
+                self.devices.mark_dirty(device_id)
+        
+        if self.persist_rotations:
+            self._maybe_flush()
+        successes = sum(results.values())
+        self.verified_ok += successes
+        self.verified_failed += len(results) - successes
+        return results
+        
+    def _maybe_flush(self):
+        now_ms = self.active_sessions.clock()
+        if (self.devices.dirty_count >= self.flush_every
+                or now_ms - self._last_flush_ms >= self.flush_interval_ms):
+            self.devices.flush()
+            self._last_flush_ms = now_ms
@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+def _monotonic_ms() -> float:
+    return time.monotonic() * 1000
+
+class RateLimitExceeded(ValueError):
+    """Richiesta respinta dal rate limiter"""
+
+class TokenBucketTable:
+    """Token bucket per chiave con ammissione O(1) e memoria limitata"""
+    def __init__(self, rate_per_s: float, burst: float, max_keys: int = 100000):
+        self.rate_per_ms = rate_per_s / 1000
+        self.burst = burst
+        self.max_keys = max_keys
+        # chiave -> [token disponibili, ultimo aggiornamento ms]; ordine LRU
+        self._buckets: OrderedDict = OrderedDict()
+        self.evicted_keys = 0
+
+    def available(self, key: Hashable, now_ms: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.burst
+        tokens = min(self.burst, bucket[0] + (now_ms - bucket[1]) * self.rate_per_ms)
+        bucket[0] = tokens
+        bucket[1] = now_ms
+        # Anche le richieste respinte rendono la chiave recente: non deve tornare piena
+        self._buckets.move_to_end(key)
+        return tokens
+
+    def consume(self, key: Hashable, now_ms: float, tokens: float = 1.0):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # Una chiave assente equivale a un bucket pieno
+            self._buckets[key] = [self.burst - tokens, now_ms]
+            if len(self._buckets) > self.max_keys:
+                # La chiave inattiva da più tempo è la più vicina a un bucket pieno
+                self._buckets.popitem(last=False)
+                self.evicted_keys += 1
+            return
+        bucket[0] -= tokens
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class AuthRateLimiter:
+    """Limiti di frequenza per dispositivo e per sorgente davanti a handle_auth_phase1"""
+    def __init__(self, device_rate_per_s: float = 5.0, device_burst: float = 10,
+                 source_rate_per_s: float = 100.0, source_burst: float = 200,
+                 max_keys: int = 100000,
+                 clock: Callable[[], float] = _monotonic_ms):
+        self.devices = TokenBucketTable(device_rate_per_s, device_burst, max_keys)
+        self.sources = TokenBucketTable(source_rate_per_s, source_burst, max_keys)
+        self.clock = clock
+        self.admitted = 0
+        self.rejected_device = 0
+        self.rejected_source = 0
+
+    def allow(self, device_id: Hashable, source: Optional[Hashable] = None) -> bool:
+        now_ms = self.clock()
+        # Si consuma un token solo se entrambi i limiti ammettono la richiesta
+        if source is not None and self.sources.available(source, now_ms) < 1:
+            self.rejected_source += 1
+            return False
+        if self.devices.available(device_id, now_ms) < 1:
+            self.rejected_device += 1
+            return False
+        if source is not None:
+            self.sources.consume(source, now_ms)
+        self.devices.consume(device_id, now_ms)
+        self.admitted += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'admitted': self.admitted,
+            'rejected_device': self.rejected_device,
+            'rejected_source': self.rejected_source,
+            'tracked_devices': len(self.devices),
+            'tracked_sources': len(self.sources),
+            'evicted_keys': self.devices.evicted_keys + self.sources.evicted_keys
+        }
@@ -0,0 +1,152 @@
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+def _monotonic_ms() -> float:
+    return time.monotonic() * 1000
+
+class SessionStore:
+    """Tabella delle sessioni con TTL, scadenza tramite timing wheel e limite per dispositivo"""
+    def __init__(self, ttl_ms: float = 30000, tick_ms: float = 100, num_slots: int = 512,
+                 max_sessions_per_device: Optional[int] = 8,
+                 max_sessions: Optional[int] = None,
+                 clock: Callable[[], float] = _monotonic_ms):
+        if max_sessions_per_device is not None and max_sessions_per_device < 1:
+            raise ValueError("Il limite di sessioni per dispositivo deve essere almeno 1")
+        if max_sessions is not None and max_sessions < 1:
+            raise ValueError("Il limite di sessioni deve essere almeno 1")
+        self.ttl_ms = ttl_ms
+        self.tick_ms = tick_ms
+        self.max_sessions_per_device = max_sessions_per_device
+        self.max_sessions = max_sessions
+        self.clock = clock
+
+        # L'ordine di inserimento dei dict permette di trovare in O(1) la sessione più vecchia
+        self._sessions: Dict[str, dict] = {}
+        self._expiry_tick: Dict[str, int] = {}
+        self._by_device: Dict[str, Dict[str, None]] = {}
+        # Hashed timing wheel: ogni slot contiene le sessioni che scadono in quel tick
+        self._wheel: List[Set[str]] = [set() for _ in range(num_slots)]
+        self._current_tick = self._tick_of(clock())
+
+        self.peak_sessions = 0
+        self.expired = 0
+        self.evicted_device_cap = 0
+        self.evicted_capacity = 0
+        self.completed = 0
+
+    def _tick_of(self, time_ms: float) -> int:
+        return int(time_ms // self.tick_ms)
+
+    def add(self, session_id: str, data: dict, ttl_ms: float = None):
+        self.expire()
+        if session_id in self._sessions:
+            self._remove(session_id)
+
+        device_id = data.get('device_id')
+        if self.max_sessions_per_device is not None:
+            while len(self._by_device.get(device_id, ())) >= self.max_sessions_per_device:
+                # Un dispositivo con troppi handshake aperti perde il più vecchio
+                self._remove(next(iter(self._by_device[device_id])))
+                self.evicted_device_cap += 1
+        if self.max_sessions is not None:
+            while len(self._sessions) >= self.max_sessions:
+                self._remove(next(iter(self._sessions)))
+                self.evicted_capacity += 1
+        device_sessions = self._by_device.setdefault(device_id, {})
+
+        ttl = self.ttl_ms if ttl_ms is None else ttl_ms
+        # Arrotonda per eccesso: una sessione non scade mai prima del proprio TTL
+        expiry_tick = self._tick_of(self.clock() + ttl) + 1
+        self._sessions[session_id] = data
+        self._expiry_tick[session_id] = expiry_tick
+        self._wheel[expiry_tick % len(self._wheel)].add(session_id)
+        device_sessions[session_id] = None
+        self.peak_sessions = max(self.peak_sessions, len(self._sessions))
+
+    def expire(self) -> int:
+        """Elimina le sessioni scadute; costo ammortizzato O(1) per sessione"""
+        now_tick = self._tick_of(self.clock())
+        if now_tick <= self._current_tick:
+            return 0
+
+        expired = 0
+        num_slots = len(self._wheel)
+        # Dopo un giro completo della ruota ogni slot è già stato visitato
+        first_tick = max(self._current_tick + 1, now_tick - num_slots + 1)
+        for tick in range(first_tick, now_tick + 1):
+            slot = self._wheel[tick % num_slots]
+            if not slot:
+                continue
+            # Le sessioni con TTL più lungo di un giro restano nello slot
+            due = [sid for sid in slot if self._expiry_tick[sid] <= now_tick]
+            for session_id in due:
+                self._remove(session_id)
+            expired += len(due)
+        self._current_tick = now_tick
+        self.expired += expired
+        return expired
+
+    def complete(self, session_id: str) -> Optional[dict]:
+        # Handshake concluso: la sessione esce dalla tabella
+        data = self.pop(session_id, None)
+        if data is not None:
+            self.completed += 1
+        return data
+
+    def _remove(self, session_id: str) -> dict:
+        data = self._sessions.pop(session_id)
+        expiry_tick = self._expiry_tick.pop(session_id)
+        self._wheel[expiry_tick % len(self._wheel)].discard(session_id)
+        device_id = data.get('device_id')
+        device_sessions = self._by_device.get(device_id)
+        if device_sessions is not None:
+            device_sessions.pop(session_id, None)
+            if not device_sessions:
+                del self._by_device[device_id]
+        return data
+
+    def pop_device(self, device_id: str) -> Dict[str, dict]:
+        # Rimuove e restituisce tutte le sessioni aperte di un dispositivo
+        return {session_id: self._remove(session_id)
+                for session_id in list(self._by_device.get(device_id, ()))}
+
+    def stats(self) -> dict:
+        return {
+            'active': len(self._sessions),
+            'devices': len(self._by_device),
+            'peak': self.peak_sessions,
+            'expired': self.expired,
+            'evicted_device_cap': self.evicted_device_cap,
+            'evicted_capacity': self.evicted_capacity,
+            'completed': self.completed
+        }
+
+    # Interfaccia di tipo dict, compatibile con l'uso precedente di active_sessions
+    def get(self, session_id: str, default=None):
+        self.expire()
+        return self._sessions.get(session_id, default)
+
+    def pop(self, session_id: str, default=None):
+        self.expire()
+        if session_id not in self._sessions:
+            return default
+        return self._remove(session_id)
+
+    def values(self):
+        # Dati delle sessioni aperte (vista in sola lettura, es. per misurarne la memoria)
+        self.expire()
+        return self._sessions.values()
+
+    def __setitem__(self, session_id: str, data: dict):
+        self.add(session_id, data)
+
+    def __getitem__(self, session_id: str) -> dict:
+        self.expire()
+        return self._sessions[session_id]
+
+    def __contains__(self, session_id: str) -> bool:
+        self.expire()
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
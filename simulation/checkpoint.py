@@ -0,0 +1,138 @@
+import os
+import struct
+from functools import partial
+from typing import Optional, Sequence
+import numpy as np
+from src.device.fleet import FLEET_COLUMNS, DeviceFleet
+from src.device.iot_device import SimulatedIoTDevice
+from src.server.device_registry import VAULT_TAGS, VAULT_TYPES, deserialize_vault, serialize_vault
+from src.simulation.provisioning import FleetProvisioner
+
+CHECKPOINT_MAGIC = b'SVCP'
+CHECKPOINT_VERSION = 1
+# magic, versione, dispositivi, offset, dimensione blob vault, n, m, tipo di vault,
+# seed (stringa pascal, vuota se la flotta non è derivata da seed), prefisso ID, clock ms
+CHECKPOINT_HEADER = struct.Struct('>4sHIIIHHc32p16pd')
+
+# Record a lunghezza fissa: stato 0 = vault ancora quello derivato dal seed
+_RECORD_FIELDS = [('power_consumption', '>f8'), ('cpu_usage', '>f8'), ('memory_usage', '>f8'),
+                  ('auth_attempts', '>i8'), ('state', 'u1'), ('vault_len', '>u4')]
+
+def _record_dtype(vault_size: int) -> np.dtype:
+    return np.dtype(_RECORD_FIELDS + [('vault', f'V{vault_size}')])
+
+def write_checkpoint(path: str, devices: Sequence[SimulatedIoTDevice],
+                     provisioner: Optional[FleetProvisioner] = None,
+                     fleet: Optional[DeviceFleet] = None, device_offset: int = 0,
+                     clock_ms: float = 0.0, prefix: str = "dev_"):
+    """Scrive vault e metriche di tutti i dispositivi in un file a record fissi"""
+    if provisioner is not None:
+        device_offset = provisioner.device_offset
+        prefix = provisioner.prefix
+        # Con una flotta da seed si scrivono solo i dispositivi materializzati
+        touched = getattr(devices, '_devices', None)
+        positions = sorted(touched) if touched is not None else range(len(devices))
+        sample = (devices[positions[0]].vault if positions
+                  else provisioner.build_vault(device_offset))
+        seed = provisioner.seed
+    else:
+        positions = range(len(devices))
+        sample = devices[0].vault if len(devices) else None
+        seed = b''
+    if sample is None:
+        raise ValueError("Nessun dispositivo da salvare")
+    if len(seed) > 31:
+        raise ValueError("Seed troppo lungo per il checkpoint (massimo 31 byte)")
+    vault_size = len(serialize_vault(sample))
+    tag = VAULT_TAGS[type(sample)]
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(devices),
+                                       device_offset, vault_size, sample.n, sample.m, tag,
+                                       seed, prefix.encode(), clock_ms))
+    # Il file viene esteso senza scrivere i record non toccati (file sparso)
+    records = np.memmap(tmp_path, dtype=_record_dtype(vault_size), mode='r+',
+                        offset=CHECKPOINT_HEADER.size, shape=(len(devices),))
+    previous = getattr(provisioner, 'records', None)
+    if previous is not None and previous.dtype == records.dtype:
+        # Da un runner ripreso: i record non toccati restano quelli del checkpoint precedente
+        records[:] = previous
+    if fleet is not None:
+        # Colonne della flotta per tutti i dispositivi; quelli materializzati, sempre
+        # allineati alle colonne dopo un blocco, le sovrascrivono qui sotto
+        for name in FLEET_COLUMNS:
+            records[name] = getattr(fleet, name)
+    for position in positions:
+        device = devices[position]
+        if device.device_id != f"{prefix}{device_offset + position}":
+            raise ValueError(f"ID dispositivo non conforme al prefisso: {device.device_id}")
+        blob = serialize_vault(device.vault)
+        if len(blob) > vault_size:
+            raise ValueError("Vault di dimensione diversa dagli altri dispositivi")
+        record = records[position:position + 1]
+        for name in FLEET_COLUMNS:
+            record[name] = getattr(device, name)
+        record['state'] = 1
+        record['vault_len'] = len(blob)
+        record['vault'] = np.void(blob.ljust(vault_size, b'\0'))
+    records.flush()
+    del records
+    # Sostituzione atomica: un crash durante il salvataggio lascia intatto il checkpoint precedente
+    os.replace(tmp_path, path)
+
+class FleetCheckpoint:
+    """Checkpoint mappato in memoria; offre la stessa interfaccia di FleetProvisioner"""
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header = f.read(CHECKPOINT_HEADER.size)
+        if len(header) < CHECKPOINT_HEADER.size:
+            raise ValueError("Checkpoint troncato")
+        (magic, version, self.num_devices, self.device_offset, vault_size, self.n, self.m,
+         tag, seed, prefix, self.clock_ms) = CHECKPOINT_HEADER.unpack(header)
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError("Formato di checkpoint non riconosciuto")
+        self.path = path
+        self.prefix = prefix.decode()
+        self.vault_cls = VAULT_TYPES[tag]
+        self.seed = seed
+        self.provisioner = (FleetProvisioner(seed, self.num_devices, self.device_offset,
+                                             self.n, self.m, self.vault_cls, self.prefix)
+                            if seed else None)
+        # Nessuna lettura dei record all'apertura: le pagine vengono caricate all'accesso
+        self.records = np.memmap(path, dtype=_record_dtype(vault_size), mode='r',
+                                 offset=CHECKPOINT_HEADER.size, shape=(self.num_devices,))
+
+    def __reduce__(self):
+        # Nei worker di un pool si riapre il file invece di serializzare i record
+        return (FleetCheckpoint, (self.path,))
+
+    # Stessi attributi di FleetProvisioner (prefix, device_offset, num_devices): ID,
+    # indici e lookup per ID riusano le sue funzioni, con il build_vault del checkpoint
+    device_id = FleetProvisioner.device_id
+    index_of = FleetProvisioner.index_of
+    vault_for = FleetProvisioner.vault_for
+
+    def build_vault(self, index: int):
+        record = self.records[index - self.device_offset]
+        if record['state'] == 0:
+            if self.provisioner is None:
+                raise ValueError(f"Vault mancante nel checkpoint: {self.device_id(index)}")
+            return self.provisioner.build_vault(index)
+        return deserialize_vault(bytes(record['vault'])[:int(record['vault_len'])])
+
+    def build_device(self, index: int) -> SimulatedIoTDevice:
+        record = self.records[index - self.device_offset]
+        device = SimulatedIoTDevice(self.device_id(index), partial(self.build_vault, index))
+        device.power_consumption = float(record['power_consumption'])
+        device.cpu_usage = float(record['cpu_usage'])
+        device.memory_usage = float(record['memory_usage'])
+        device.auth_attempts = int(record['auth_attempts'])
+        return device
+
+    def build_fleet(self) -> DeviceFleet:
+        # Colonne della flotta ricostruite con copie vettoriali dal file mappato
+        fleet = DeviceFleet(self.num_devices)
+        for name in FLEET_COLUMNS:
+            getattr(fleet, name)[:] = self.records[name]
+        return fleet
@@ -0,0 +1,200 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List
+import numpy as np
+from src.device.iot_device import PHASE_DURATIONS_MS
+from src.security.auth_protocol import AuthenticationMessage
+from src.server.rate_limiter import RateLimitExceeded
+from src.simulation.metrics import summarize
+
+def _check_rate(rate_hps: float, duration_s: float):
+    if rate_hps <= 0 or duration_s <= 0:
+        raise ValueError("Tasso di arrivo e durata devono essere positivi")
+
+def constant_arrivals(rate_hps: float, duration_s: float,
+                      rng: np.random.Generator = None) -> np.ndarray:
+    """Istanti di avvio previsti (ms) a intervalli regolari"""
+    _check_rate(rate_hps, duration_s)
+    return np.arange(int(rate_hps * duration_s)) * (1000.0 / rate_hps)
+
+def poisson_arrivals(rate_hps: float, duration_s: float,
+                     rng: np.random.Generator = None) -> np.ndarray:
+    """Arrivi di Poisson: numero poissoniano, istanti uniformi nella finestra"""
+    _check_rate(rate_hps, duration_s)
+    rng = rng or np.random.default_rng()
+    count = rng.poisson(rate_hps * duration_s)
+    return np.sort(rng.uniform(0.0, duration_s * 1000, count))
+
+def bursty_ramp_arrivals(rate_hps: float, duration_s: float,
+                         rng: np.random.Generator = None, burst_factor: float = 4.0,
+                         burst_period_s: float = 1.0,
+                         burst_duration_s: float = 0.1) -> np.ndarray:
+    """Rampa lineare da 0 a rate_hps con raffiche periodiche a burst_factor volte il tasso"""
+    _check_rate(rate_hps, duration_s)
+    if burst_factor < 1:
+        raise ValueError("burst_factor deve essere almeno 1")
+    rng = rng or np.random.default_rng()
+    # Poisson non omogeneo per thinning da un processo al tasso massimo
+    peak_hps = rate_hps * burst_factor
+    candidates = poisson_arrivals(peak_hps, duration_s, rng)
+    t_s = candidates / 1000
+    rate = rate_hps * t_s / duration_s
+    rate = np.where(t_s % burst_period_s < burst_duration_s, rate * burst_factor, rate)
+    return candidates[rng.uniform(0.0, peak_hps, len(candidates)) < rate]
+
+ARRIVAL_SCHEDULES = {
+    'constant': constant_arrivals,
+    'poisson': poisson_arrivals,
+    'bursty_ramp': bursty_ramp_arrivals
+}
+
+@dataclass
+class _Request:
+    intended_ms: float
+    position: int = -1
+    device: object = None
+    phase: str = 'phase1'
+    enqueued_ms: float = 0.0
+
+@dataclass
+class _LoadResults:
+    latencies_ms: List[float] = field(default_factory=list)
+    service_ms: List[float] = field(default_factory=list)
+    queue_wait_ms: List[float] = field(default_factory=list)
+    successes: int = 0
+    failures: int = 0
+    device_waits: int = 0
+    max_queue_depth: int = 0
+    busy_ms: float = 0.0
+    first_completion_ms: float = None
+    last_completion_ms: float = 0.0
+
+class OpenLoopLoadGenerator:
+    """Handshake avviati secondo un calendario di arrivi, indipendente dai completamenti.
+
+    Il server elabora le richieste una alla volta in ordine FIFO; il tempo di servizio è
+    il tempo di calcolo reale delle chiamate al server. La latenza è misurata dall'istante
+    di avvio previsto, quindi include ogni attesa in coda (nessuna coordinated omission).
+    """
+    def __init__(self, runner):
+        if not runner.virtual_time:
+            raise ValueError("Il generatore di carico richiede virtual_time=True")
+        self.runner = runner
+        self.scheduler = runner.scheduler
+        self.server = runner.server
+        self.channel = runner.channel
+
+    def run(self, arrivals_ms: np.ndarray) -> Dict:
+        origin_ms = self.scheduler.now_ms
+        self._results = _LoadResults()
+        self._queue: deque = deque()
+        self._busy = False
+        # Un dispositivo ha un solo handshake aperto alla volta (stato dell'authenticator)
+        self._idle_devices = deque(range(len(self.runner.devices)))
+        self._waiting: deque = deque()
+        if not self._idle_devices:
+            raise ValueError("Nessun dispositivo per generare il carico")
+        for intended_ms in arrivals_ms:
+            self.scheduler.schedule_at(origin_ms + float(intended_ms), self._start,
+                                       _Request(origin_ms + float(intended_ms)))
+        self.scheduler.run()
+        return self._report(arrivals_ms, origin_ms)
+
+    def _start(self, request: _Request):
+        if not self._idle_devices:
+            # Flotta esaurita: la richiesta attende un dispositivo, ma la latenza
+            # continua a contare dall'istante previsto
+            self._results.device_waits += 1
+            self._waiting.append(request)
+            return
+        request.position = self._idle_devices.popleft()
+        request.device = self.runner.devices[request.position]
+        msg, delay = self.channel.send(request.device.authenticator.initiate_auth())
+        self.scheduler.schedule(PHASE_DURATIONS_MS['init'] + delay, self._arrive, request, msg)
+
+    def _arrive(self, request: _Request, msg: AuthenticationMessage):
+        request.enqueued_ms = self.scheduler.now_ms
+        self._queue.append((request, msg))
+        self._results.max_queue_depth = max(self._results.max_queue_depth, len(self._queue))
+        if not self._busy:
+            self._serve_next()
+
+    def _serve_next(self):
+        request, msg = self._queue.popleft()
+        self._busy = True
+        self._results.queue_wait_ms.append(self.scheduler.now_ms - request.enqueued_ms)
+        cpu_start = time.perf_counter()
+        if request.phase == 'phase1':
+            try:
+                result = self.server.handle_auth_phase1(msg)
+            except (RateLimitExceeded, ValueError):
+                result = None
+        else:
+            result = self.server.handle_auth_phase2(msg)
+        service_ms = (time.perf_counter() - cpu_start) * 1000
+        self._results.service_ms.append(service_ms)
+        self._results.busy_ms += service_ms
+        self.scheduler.schedule(service_ms, self._served, request, msg, result)
+
+    def _served(self, request: _Request, msg: AuthenticationMessage, result):
+        self._busy = False
+        if request.phase == 'phase2':
+            if result:
+                request.device.vault.update_vault(msg.session_id.encode())
+            self.scheduler.schedule(PHASE_DURATIONS_MS['vault_update'], self._complete,
+                                    request, bool(result))
+        elif result is None:
+            # Richiesta respinta: il dispositivo lo scopre dopo il ritardo di ritorno
+            self.scheduler.schedule(self.channel.sample_delay_ms(), self._complete,
+                                    request, False)
+        else:
+            challenge, down_ms = self.channel.send(result)
+            response, up_ms = self.channel.send(
+                request.device.authenticator.handle_challenge(challenge))
+            request.phase = 'phase2'
+            device_ms = PHASE_DURATIONS_MS['challenge'] + PHASE_DURATIONS_MS['response']
+            self.scheduler.schedule(down_ms + device_ms + up_ms, self._arrive, request, response)
+        if self._queue:
+            self._serve_next()
+
+    def _complete(self, request: _Request, success: bool):
+        results = self._results
+        results.latencies_ms.append(self.scheduler.now_ms - request.intended_ms)
+        if results.first_completion_ms is None:
+            results.first_completion_ms = self.scheduler.now_ms
+        results.last_completion_ms = self.scheduler.now_ms
+        if success:
+            results.successes += 1
+        else:
+            results.failures += 1
+        request.device.reset_metrics()
+        self._idle_devices.append(request.position)
+        if self._waiting:
+            self._start(self._waiting.popleft())
+
+    def _report(self, arrivals_ms: np.ndarray, origin_ms: float) -> Dict:
+        results = self._results
+        completed = len(results.latencies_ms)
+        # Tassi come intervalli tra il primo e l'ultimo evento: la latenza costante
+        # di rete non diluisce il throughput misurato
+        offered_span_s = (float(arrivals_ms[-1] - arrivals_ms[0]) / 1000
+                          if len(arrivals_ms) else 0.0)
+        completion_span_s = ((results.last_completion_ms - results.first_completion_ms) / 1000
+                             if completed else 0.0)
+        elapsed_s = (results.last_completion_ms - origin_ms) / 1000 if completed else 0.0
+        return {
+            'offered': len(arrivals_ms),
+            'offered_hps': ((len(arrivals_ms) - 1) / offered_span_s
+                            if offered_span_s > 0 else 0.0),
+            'completed': completed,
+            'throughput_hps': ((completed - 1) / completion_span_s
+                               if completion_span_s > 0 else 0.0),
+            'success_rate': results.successes / completed if completed else 0.0,
+            'latency_ms': summarize(results.latencies_ms),
+            'queue_wait_ms': summarize(results.queue_wait_ms),
+            'service_ms': summarize(results.service_ms),
+            'server_utilization': (results.busy_ms / 1000 / elapsed_s) if elapsed_s > 0 else 0.0,
+            'max_queue_depth': results.max_queue_depth,
+            'device_waits': results.device_waits
+        }
@@ -0,0 +1,133 @@
+import sys
+import tracemalloc
+from collections import deque
+from types import FunctionType, ModuleType
+from typing import Dict, List, Optional
+import numpy as np
+
+# Oggetti condivisi da tutte le istanze: non fanno parte dell'impronta di un singolo oggetto
+_SHARED_TYPES = (type, ModuleType, FunctionType)
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Byte occupati da un oggetto e da tutto ciò che raggiunge (ogni oggetto contato una volta)"""
+    if seen is None:
+        seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, np.ndarray):
+            # getsizeof include già i dati solo se l'array li possiede
+            if current.base is not None:
+                stack.append(current.base)
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        if hasattr(current, '__dict__'):
+            stack.append(current.__dict__)
+        for slot in getattr(type(current), '__slots__', ()):
+            if hasattr(current, slot):
+                stack.append(getattr(current, slot))
+    return total
+
+class _NullPhase:
+    """Fase vuota condivisa: con il profiling disabilitato non si misura nulla"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'track', 'start')
+
+    def __init__(self, profiler: 'MemoryProfiler', name: str, track: str):
+        self.profiler = profiler
+        self.name = name
+        self.track = track
+
+    def __enter__(self):
+        # Il picco di tracemalloc è globale e viene azzerato a ogni fase: una fase aperta
+        # mentre un'altra è in corso ne falserebbe il picco
+        if self.profiler._open is not None:
+            raise ValueError(f"Fase '{self.name}' aperta durante '{self.profiler._open.name}': "
+                             "il profiling per fase richiede handshake non interlacciati")
+        self.profiler._open = self
+        tracemalloc.reset_peak()
+        self.start = tracemalloc.get_traced_memory()[0]
+        self.profiler._handshakes.setdefault(self.track, [self.start, 0])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current, peak = tracemalloc.get_traced_memory()
+        self.profiler._open = None
+        self.profiler._record(self, current - self.start, peak - self.start)
+        return False
+
+class MemoryProfiler:
+    """Allocazioni misurate con tracemalloc per fase dell'handshake (net e picco in byte).
+
+    Una sola fase alla volta: con handshake interlacciati aprire una fase solleva ValueError.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # Per fase: [conteggio, somma net, somma picchi, picco massimo]
+        self._phases: Dict[str, List[int]] = {}
+        # Per traccia: [memoria all'inizio dell'handshake, picco relativo]
+        self._handshakes: Dict[str, List[int]] = {}
+        self._open: Optional[_Phase] = None
+        self._started = False
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    def phase(self, name: str, track: str = 'main'):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, track)
+
+    def _record(self, phase: _Phase, net_bytes: int, peak_bytes: int):
+        entry = self._phases.setdefault(phase.name, [0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += net_bytes
+        entry[2] += peak_bytes
+        entry[3] = max(entry[3], peak_bytes)
+        handshake = self._handshakes[phase.track]
+        handshake[1] = max(handshake[1], phase.start - handshake[0] + peak_bytes)
+
+    def pop_handshake(self, track: str) -> Optional[int]:
+        # Picco dell'handshake appena concluso, relativo alla memoria al suo inizio
+        handshake = self._handshakes.pop(track, None)
+        return None if handshake is None else handshake[1]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                'count': count,
+                'mean_net_bytes': net / count,
+                'mean_peak_bytes': peak / count,
+                'max_peak_bytes': max_peak
+            }
+            for name, (count, net, peak, max_peak) in self._phases.items()
+        }
+
+    def clear(self):
+        self._open = None
+        self._phases.clear()
+        self._handshakes.clear()
+
+    def close(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
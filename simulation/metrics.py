@@ -1,18 +1,223 @@
-from dataclasses import dataclass
-from typing import List, Dict
+import math
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, List, Dict, Union
+
+PHASES = ('init', 'challenge', 'response', 'vault_update')
+SERIES = ('auth_time_ms', 'power_consumption_mwh', 'memory_usage_kb')
+
+class StreamingHistogram:
+    """Istogramma log-lineare a memoria fissa (stile HDR) per percentili in streaming"""
+    def __init__(self, lowest: float = 1e-6, highest: float = 1e7, sub_buckets: int = 128):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self._min_exp = math.floor(math.log2(lowest))
+        self._max_exp = math.ceil(math.log2(highest))
+        # Errore relativo massimo 1/sub_buckets; i valori fuori intervallo vengono saturati
+        self.counts = array('Q', bytes(8 * (self._max_exp - self._min_exp) * sub_buckets))
+        self.count = 0
+        self.zeros = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= m < 1
+        exp = min(max(exponent - 1, self._min_exp), self._max_exp - 1)
+        if exp != exponent - 1:
+            mantissa = 0.999999 if exp < exponent - 1 else 0.5
+        sub = int((mantissa * 2 - 1) * self.sub_buckets)
+        return (exp - self._min_exp) * self.sub_buckets + sub
+
+    def _value_at(self, index: int) -> float:
+        # Limite superiore del bucket: i percentili non sottostimano mai la coda
+        exp, sub = divmod(index, self.sub_buckets)
+        return 2.0 ** (exp + self._min_exp) * (1 + (sub + 1) / self.sub_buckets)
+
+    def record(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+        else:
+            self.counts[self._index(value)] += 1
+
+    def merge(self, other: 'StreamingHistogram'):
+        if (other.sub_buckets, other._min_exp, other._max_exp) != \
+                (self.sub_buckets, self._min_exp, self._max_exp):
+            raise ValueError("Istogrammi con configurazione diversa")
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.zeros += other.zeros
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        if rank >= self.count:
+            return self.max
+        if rank <= self.zeros:
+            return min(self.min, 0.0)
+        seen = self.zeros
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self._value_at(i), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
 
 @dataclass
 class SimulationMetrics:
-    auth_time_ms: List[float] = None
-    power_consumption_mwh: List[float] = None
-    memory_usage_kb: List[float] = None
-    
+    auth_time_ms: array = None
+    power_consumption_mwh: array = None
+    memory_usage_kb: array = None
+    phase_energy_mwh: Dict[str, array] = None
+    # streaming=True: solo istogrammi a memoria costante, nessun campione memorizzato
+    streaming: bool = False
+    histograms: Dict[str, StreamingHistogram] = field(default=None, repr=False)
+    successes: int = 0
+    failures: int = 0
+
     def __post_init__(self):
-        self.auth_time_ms = []
-        self.power_consumption_mwh = []
-        self.memory_usage_kb = []
-        
-    def add_measurement(self, auth_time: float, power: float, memory: float):
+        self.auth_time_ms = array('d')
+        self.power_consumption_mwh = array('d')
+        self.memory_usage_kb = array('d')
+        self.phase_energy_mwh = {phase: array('d') for phase in PHASES}
+        self.histograms = {}
+        if self.streaming:
+            for name in SERIES + tuple(f'phase:{phase}' for phase in PHASES):
+                self.histograms[name] = StreamingHistogram()
+
+    def add_measurement(self, auth_time: float, power: float, memory: float,
+                        success: bool = True):
+        if success:
+            self.successes += 1
+        else:
+            self.failures += 1
+        if self.streaming:
+            self.histograms['auth_time_ms'].record(auth_time)
+            self.histograms['power_consumption_mwh'].record(power)
+            self.histograms['memory_usage_kb'].record(memory)
+            return
         self.auth_time_ms.append(auth_time)
         self.power_consumption_mwh.append(power)
-        self.memory_usage_kb.append(memory) 
\ No newline at end of file
+        self.memory_usage_kb.append(memory)
+
+    def add_measurements(self, auth_times: Iterable[float], powers: Iterable[float],
+                         memories: Iterable[float], successes: Iterable[bool]):
+        # Variante a blocchi per le esecuzioni vettoriali della flotta
+        successes = list(successes)
+        ok = sum(1 for success in successes if success)
+        self.successes += ok
+        self.failures += len(successes) - ok
+        for name, values in zip(SERIES, (auth_times, powers, memories)):
+            if self.streaming:
+                hist = self.histograms[name]
+                for value in values:
+                    hist.record(value)
+            else:
+                getattr(self, name).extend(values)
+
+    def add_phase_energy(self, phase: str, energy_mwh: float):
+        if self.streaming:
+            self.histograms[f'phase:{phase}'].record(energy_mwh)
+        else:
+            self.phase_energy_mwh.setdefault(phase, array('d')).append(energy_mwh)
+
+    def add_phase_energies(self, phase: str, energies_mwh: Iterable[float]):
+        if self.streaming:
+            hist = self.histograms[f'phase:{phase}']
+            for value in energies_mwh:
+                hist.record(value)
+        else:
+            self.phase_energy_mwh.setdefault(phase, array('d')).extend(energies_mwh)
+
+    def count(self) -> int:
+        if self.streaming:
+            return self.histograms['auth_time_ms'].count
+        return len(self.auth_time_ms)
+
+    def success_rate(self) -> float:
+        total = self.successes + self.failures
+        return self.successes / total if total else 0.0
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """Statistiche di una serie ('auth_time_ms', ... o 'phase:<fase>')"""
+        if self.streaming:
+            hist = self.histograms[name]
+            return {
+                'count': hist.count,
+                'mean': hist.mean,
+                'p50': hist.percentile(50),
+                'p95': hist.percentile(95),
+                'p99': hist.percentile(99),
+                'max': hist.max if hist.count else 0.0
+            }
+        if name.startswith('phase:'):
+            values = self.phase_energy_mwh.get(name[len('phase:'):], array('d'))
+        else:
+            values = getattr(self, name)
+        return summarize(values)
+
+    def merge(self, other: 'SimulationMetrics'):
+        # Unisce le misurazioni di un altro shard a queste
+        if other.streaming and not self.streaming:
+            raise ValueError("Impossibile unire metriche in streaming in metriche campionate")
+        self.successes += other.successes
+        self.failures += other.failures
+        if self.streaming:
+            if other.streaming:
+                for name, hist in other.histograms.items():
+                    self.histograms[name].merge(hist)
+            else:
+                for name in SERIES:
+                    for value in getattr(other, name):
+                        self.histograms[name].record(value)
+                for phase, values in other.phase_energy_mwh.items():
+                    for value in values:
+                        self.histograms[f'phase:{phase}'].record(value)
+            return
+        self.auth_time_ms.extend(other.auth_time_ms)
+        self.power_consumption_mwh.extend(other.power_consumption_mwh)
+        self.memory_usage_kb.extend(other.memory_usage_kb)
+        for phase, values in other.phase_energy_mwh.items():
+            self.phase_energy_mwh.setdefault(phase, array('d')).extend(values)
+
+    @classmethod
+    def merged(cls, parts: List['SimulationMetrics']) -> 'SimulationMetrics':
+        result = cls(streaming=any(part.streaming for part in parts))
+        for part in parts:
+            result.merge(part)
+        return result
+
+def percentile(values: Iterable[float], p: float) -> float:
+    """Percentile con metodo nearest-rank (p in [0, 100])"""
+    return _nearest_rank(sorted(values), p)
+
+def _nearest_rank(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(values: Union[array, List[float]]) -> Dict[str, float]:
+    # Un solo ordinamento per tutti i percentili
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+        'p50': _nearest_rank(ordered, 50),
+        'p95': _nearest_rank(ordered, 95),
+        'p99': _nearest_rank(ordered, 99),
+        'max': ordered[-1] if ordered else 0.0
+    }
@@ -0,0 +1,85 @@
+import base64
+import hashlib
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from src.device.iot_device import SimulatedIoTDevice
+from src.security.secure_vault import SecureVault
+
+class FleetProvisioner:
+    """Deriva deterministicamente il materiale dei vault da un seed e dall'indice del dispositivo"""
+    def __init__(self, seed: Union[int, bytes], num_devices: int, device_offset: int = 0,
+                 n: int = 10, m: int = 128, vault_cls=SecureVault, prefix: str = "dev_"):
+        if isinstance(seed, int):
+            seed = seed.to_bytes(16, 'big', signed=True)
+        self.seed = seed
+        self.num_devices = num_devices
+        self.device_offset = device_offset
+        self.n = n
+        self.m = m
+        self.vault_cls = vault_cls  # deve offrire from_material
+        self.prefix = prefix
+
+    def device_id(self, index: int) -> str:
+        return f"{self.prefix}{index}"
+
+    def index_of(self, device_id: str) -> Optional[int]:
+        # Restituisce l'indice solo per gli ID che appartengono a questa flotta
+        if not isinstance(device_id, str) or not device_id.startswith(self.prefix):
+            return None
+        suffix = device_id[len(self.prefix):]
+        if not suffix.isdigit():
+            return None
+        index = int(suffix)
+        if self.device_offset <= index < self.device_offset + self.num_devices:
+            return index
+        return None
+
+    def vault_material(self, index: int) -> Tuple[bytes, List[bytes]]:
+        # Un solo XOF per dispositivo: 32 byte di chiave Fernet seguiti dalle n chiavi
+        key_len = self.m // 8
+        digest = hashlib.shake_256(self.seed + index.to_bytes(8, 'big')).digest(
+            32 + self.n * key_len
+        )
+        encryption_key = base64.urlsafe_b64encode(digest[:32])
+        raw_keys = [digest[32 + i * key_len:32 + (i + 1) * key_len] for i in range(self.n)]
+        return encryption_key, raw_keys
+
+    def build_vault(self, index: int):
+        encryption_key, raw_keys = self.vault_material(index)
+        return self.vault_cls.from_material(encryption_key, raw_keys, self.m)
+
+    def vault_for(self, device_id: str):
+        index = self.index_of(device_id)
+        return None if index is None else self.build_vault(index)
+
+    def build_device(self, index: int) -> SimulatedIoTDevice:
+        # Il vault viene derivato solo alla creazione del dispositivo
+        return SimulatedIoTDevice(self.device_id(index), partial(self.build_vault, index))
+
+class LazyDeviceList:
+    """Sequenza di dispositivi creati solo al primo accesso (da provisioner o checkpoint)"""
+    def __init__(self, provisioner: FleetProvisioner):
+        self.provisioner = provisioner
+        self._devices: Dict[int, SimulatedIoTDevice] = {}
+
+    def __len__(self) -> int:
+        return self.provisioner.num_devices
+
+    def __getitem__(self, position: int) -> SimulatedIoTDevice:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("Indice dispositivo fuori intervallo")
+        device = self._devices.get(position)
+        if device is None:
+            device = self.provisioner.build_device(self.provisioner.device_offset + position)
+            self._devices[position] = device
+        return device
+
+    def __iter__(self) -> Iterator[SimulatedIoTDevice]:
+        for position in range(len(self)):
+            yield self[position]
+
+    @property
+    def materialized(self) -> int:
+        return len(self._devices)
@@ -0,0 +1,244 @@
+import json
+from abc import ABC, abstractmethod
+import math
+import struct
+import time
+from dataclasses import asdict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from src.security.attack_simulator import AttackResult
+from src.simulation.metrics import PHASES, SimulationMetrics
+
+# Blocco del formato colonnare: magic, tipo ('H' handshake, 'A' attacchi), record, byte del payload
+COLUMNAR_MAGIC = b'SVRS'
+BLOCK_HEADER = struct.Struct('>4scII')
+_COLUMNS = ('auth_time_ms', 'power_mwh', 'memory_kb')
+
+class ResultsSink(ABC):
+    """Scrittura incrementale di handshake e AttackResult, svuotata a blocchi"""
+    def __init__(self, path: str, batch_size: int = 1000, flush_interval_s: float = 5.0):
+        if batch_size < 1:
+            raise ValueError("batch_size deve essere almeno 1")
+        self.path = path
+        self.batch_size = batch_size
+        # Anche con poco traffico i risultati parziali diventano visibili entro l'intervallo
+        self.flush_interval_s = flush_interval_s
+        self._file = open(path, 'ab')
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.records_written = 0
+
+    def write_handshake(self, device_id: str, auth_time_ms: float, power_mwh: float,
+                        memory_kb: float, success: bool,
+                        phase_energy_mwh: Optional[Dict[str, float]] = None):
+        self._buffer_handshake(device_id, auth_time_ms, power_mwh, memory_kb, success,
+                               phase_energy_mwh or {})
+        self._record_added(1)
+
+    def write_handshakes(self, device_ids: Sequence[str], auth_times: Sequence[float],
+                         powers: Sequence[float], memories: Sequence[float],
+                         successes: Sequence[bool],
+                         phase_energies: Optional[Dict[str, Sequence[float]]] = None):
+        phase_energies = phase_energies or {}
+        for i, record in enumerate(zip(device_ids, auth_times, powers, memories, successes)):
+            self._buffer_handshake(*record, {phase: float(values[i])
+                                             for phase, values in phase_energies.items()})
+        self._record_added(len(device_ids))
+
+    def write_attack(self, result: AttackResult):
+        self._buffer_attack(result)
+        self._record_added(1)
+
+    def _record_added(self, count: int):
+        self._pending += count
+        if (self._pending >= self.batch_size or
+                time.monotonic() - self._last_flush >= self.flush_interval_s):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._file.write(self._drain())
+            self.records_written += self._pending
+            self._pending = 0
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> 'ResultsSink':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @abstractmethod
+    def _buffer_handshake(self, device_id, auth_time_ms, power_mwh, memory_kb, success,
+                          phase_energy_mwh):
+        """Accoda un handshake nel buffer del formato"""
+
+    @abstractmethod
+    def _buffer_attack(self, result: AttackResult):
+        """Accoda un AttackResult nel buffer del formato"""
+
+    @abstractmethod
+    def _drain(self) -> bytes:
+        """Serializza e svuota il buffer"""
+
+class JsonlSink(ResultsSink):
+    """Una riga JSON per record: leggibile con tail/jq mentre la simulazione è in corso"""
+    def __init__(self, path: str, batch_size: int = 1000, flush_interval_s: float = 5.0):
+        super().__init__(path, batch_size, flush_interval_s)
+        self._lines: List[str] = []
+
+    def _buffer_handshake(self, device_id, auth_time_ms, power_mwh, memory_kb, success,
+                          phase_energy_mwh):
+        self._lines.append(json.dumps({
+            'type': 'handshake', 'device_id': device_id, 'auth_time_ms': auth_time_ms,
+            'power_mwh': power_mwh, 'memory_kb': memory_kb, 'success': bool(success),
+            'phase_energy_mwh': phase_energy_mwh
+        }))
+
+    def _buffer_attack(self, result: AttackResult):
+        self._lines.append(json.dumps({'type': 'attack', **asdict(result)}))
+
+    def _drain(self) -> bytes:
+        data = ''.join(line + '\n' for line in self._lines).encode()
+        self._lines.clear()
+        return data
+
+class ColumnarSink(ResultsSink):
+    """Blocchi binari autonomi: ogni blocco di handshake contiene colonne float64 contigue"""
+    def __init__(self, path: str, batch_size: int = 4096, flush_interval_s: float = 5.0):
+        super().__init__(path, batch_size, flush_interval_s)
+        self._device_ids: List[str] = []
+        self._columns: Dict[str, List[float]] = {name: [] for name in _COLUMNS}
+        self._success: List[bool] = []
+        self._phases: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+        self._attacks: List[dict] = []
+
+    def _buffer_handshake(self, device_id, auth_time_ms, power_mwh, memory_kb, success,
+                          phase_energy_mwh):
+        self._device_ids.append(device_id)
+        for name, value in zip(_COLUMNS, (auth_time_ms, power_mwh, memory_kb)):
+            self._columns[name].append(value)
+        self._success.append(bool(success))
+        # NaN = energia di fase non registrata per questo handshake
+        for phase in PHASES:
+            self._phases[phase].append(phase_energy_mwh.get(phase, math.nan))
+
+    def _buffer_attack(self, result: AttackResult):
+        self._attacks.append(asdict(result))
+
+    def _drain(self) -> bytes:
+        blocks = []
+        if self._device_ids:
+            parts = [np.asarray(self._columns[name], dtype='<f8').tobytes() for name in _COLUMNS]
+            parts.append(np.asarray(self._success, dtype=np.uint8).tobytes())
+            parts.extend(np.asarray(self._phases[phase], dtype='<f8').tobytes()
+                         for phase in PHASES)
+            parts.append('\n'.join(self._device_ids).encode())
+            payload = b''.join(parts)
+            blocks.append(BLOCK_HEADER.pack(COLUMNAR_MAGIC, b'H', len(self._device_ids),
+                                            len(payload)))
+            blocks.append(payload)
+            self._device_ids.clear()
+            self._success.clear()
+            for values in (*self._columns.values(), *self._phases.values()):
+                values.clear()
+        if self._attacks:
+            payload = json.dumps(self._attacks).encode()
+            blocks.append(BLOCK_HEADER.pack(COLUMNAR_MAGIC, b'A', len(self._attacks), len(payload)))
+            blocks.append(payload)
+            self._attacks.clear()
+        return b''.join(blocks)
+
+SINK_FORMATS = {'jsonl': JsonlSink, 'columnar': ColumnarSink}
+
+def open_results_sink(path: str, fmt: str = None, **kwargs) -> ResultsSink:
+    # Formato dedotto dall'estensione se non indicato (.jsonl, altrimenti colonnare)
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith('.jsonl') else 'columnar'
+    if fmt not in SINK_FORMATS:
+        raise ValueError(f"Formato sconosciuto: {fmt}")
+    return SINK_FORMATS[fmt](path, **kwargs)
+
+def iter_result_batches(path: str) -> Iterator[Tuple[str, object]]:
+    """Legge il file a blocchi: ('handshakes', colonne) oppure ('attack', AttackResult).
+
+    Un record incompleto in coda (file ancora in scrittura) viene ignorato.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(COLUMNAR_MAGIC))
+        f.seek(0)
+        if magic == COLUMNAR_MAGIC:
+            yield from _iter_columnar(f)
+        else:
+            yield from _iter_jsonl(f)
+
+def _iter_columnar(f) -> Iterator[Tuple[str, object]]:
+    while True:
+        header = f.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return
+        magic, kind, count, length = BLOCK_HEADER.unpack(header)
+        if magic != COLUMNAR_MAGIC:
+            raise ValueError("Blocco non valido nel file dei risultati")
+        payload = f.read(length)
+        if len(payload) < length:
+            return
+        if kind == b'A':
+            for record in json.loads(payload):
+                yield 'attack', AttackResult(**record)
+            continue
+        offset = 0
+        columns = {}
+        for name in _COLUMNS:
+            columns[name] = np.frombuffer(payload, dtype='<f8', count=count, offset=offset)
+            offset += 8 * count
+        columns['success'] = np.frombuffer(payload, dtype=np.uint8, count=count,
+                                           offset=offset).astype(bool)
+        offset += count
+        for phase in PHASES:
+            columns[f'phase:{phase}'] = np.frombuffer(payload, dtype='<f8', count=count,
+                                                      offset=offset)
+            offset += 8 * count
+        columns['device_id'] = payload[offset:].decode().split('\n') if count else []
+        yield 'handshakes', columns
+
+def _iter_jsonl(f) -> Iterator[Tuple[str, object]]:
+    for line in f:
+        if not line.endswith(b'\n'):
+            return  # riga parziale: lo scrittore non l'ha ancora completata
+        record = json.loads(line)
+        kind = record.pop('type')
+        if kind == 'attack':
+            yield 'attack', AttackResult(**record)
+            continue
+        phases = record['phase_energy_mwh']
+        yield 'handshakes', {
+            'device_id': [record['device_id']],
+            'auth_time_ms': [record['auth_time_ms']],
+            'power_mwh': [record['power_mwh']],
+            'memory_kb': [record['memory_kb']],
+            'success': [record['success']],
+            **{f'phase:{phase}': [phases.get(phase, math.nan)] for phase in PHASES}
+        }
+
+def load_streaming_metrics(path: str) -> Tuple[SimulationMetrics, List[AttackResult]]:
+    """Ricostruisce metriche a memoria costante (istogrammi) e gli AttackResult dal file"""
+    metrics = SimulationMetrics(streaming=True)
+    attacks: List[AttackResult] = []
+    for kind, batch in iter_result_batches(path):
+        if kind == 'attack':
+            attacks.append(batch)
+            continue
+        metrics.add_measurements(batch['auth_time_ms'], batch['power_mwh'],
+                                 batch['memory_kb'], batch['success'])
+        for phase in PHASES:
+            metrics.add_phase_energies(phase, (value for value in batch[f'phase:{phase}']
+                                               if not math.isnan(value)))
+    return metrics, attacks
@@ -1,67 +1,565 @@
-from typing import List
+from typing import Callable, List, Dict, Optional
+import asyncio
+import os
 import time
-from src.device.iot_device import SimulatedIoTDevice
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.device.fleet import DeviceFleet
+from src.device.iot_device import PHASE_DURATIONS_MS, SimulatedIoTDevice
+from src.security.secure_vault import SecureVault
+from src.security.auth_protocol import AuthenticationMessage
 from src.server.iot_server import IoTServer
+from src.server.cluster import IoTServerCluster
 from src.network.channel import SimulatedChannel
-from src.simulation.metrics import SimulationMetrics
-from src.security.attack_simulator import SecurityTestSuite
+from src.simulation.metrics import SimulationMetrics, percentile
+from src.simulation.scheduler import EventScheduler
+from src.simulation.tracing import Tracer
+from src.simulation.memory import MemoryProfiler, deep_sizeof
+from src.simulation.results_sink import ResultsSink
+from src.simulation.load_generator import ARRIVAL_SCHEDULES, OpenLoopLoadGenerator
+from src.simulation.provisioning import FleetProvisioner, LazyDeviceList
+from src.simulation.checkpoint import FleetCheckpoint, write_checkpoint
+from src.security.attack_simulator import ATTACKS, SecurityTestSuite
+from src.security.campaign import run_attack_campaign
 
 class SimulationRunner:
-    def __init__(self, num_devices: int):
-        self.devices = [SimulatedIoTDevice(f"dev_{i}") 
-                       for i in range(num_devices)]
-        self.server = IoTServer()
-        self.channel = SimulatedChannel()
-        self.metrics = SimulationMetrics()
-        
-        # Registra i dispositivi nel server
-        for device in self.devices:
-            self.server.devices[device.device_id] = device.vault
+    def __init__(self, num_devices: int, virtual_time: bool = False,
+                 device_offset: int = 0,
+                 vault_factory: Callable[[], SecureVault] = SecureVault,
+                 seed: Optional[int] = None, streaming_metrics: bool = False,
+                 tracing: bool = False, provisioner=None, server_shards: int = 0,
+                 sink: Optional[ResultsSink] = None, memory_profiling: bool = False,
+                 vault_n: int = 10, vault_m: int = 128):
+        startup_start = time.perf_counter()
+        self.device_offset = device_offset
+        # Con un seed (o un checkpoint) i vault sono derivati in modo riproducibile e i
+        # dispositivi vengono creati solo quando sono schedulati per la prima volta
+        self.provisioner = provisioner
+        if self.provisioner is None and seed is not None:
+            # Il provisioner deriva i vault con from_material: serve la classe, non una
+            # factory qualsiasi; n e m si passano con vault_n/vault_m
+            if not hasattr(vault_factory, 'from_material'):
+                raise ValueError("Con un seed vault_factory deve essere una classe di vault "
+                                 "con from_material (usare vault_n/vault_m per n e m)")
+            self.provisioner = FleetProvisioner(seed, num_devices, device_offset,
+                                                n=vault_n, m=vault_m, vault_cls=vault_factory)
+        if self.provisioner is not None:
+            self.devices = LazyDeviceList(self.provisioner)
+        else:
+            if hasattr(vault_factory, 'from_material'):
+                # Classe di vault: n e m vengono da vault_n/vault_m come per la flotta con seed
+                vault_factory = partial(vault_factory, vault_n, vault_m)
+            # device_offset permette a ogni shard di possedere un intervallo di ID distinto
+            self.devices = [SimulatedIoTDevice(f"dev_{i}", vault_factory) 
+                           for i in range(device_offset, device_offset + num_devices)]
+        devices_ready = time.perf_counter()
+        
+        # In modalità virtual_time latenze e operazioni avanzano un clock simulato
+        self.virtual_time = virtual_time
+        self.scheduler = EventScheduler() if virtual_time else None
+        # Anche la scadenza delle sessioni segue il tempo simulato
+        if server_shards:
+            # Server a più processi: le sessioni scadono secondo il clock di sistema degli shard
+            self.server = IoTServerCluster(server_shards, provisioner=self.provisioner)
+        else:
+            self.server = IoTServer(
+                clock=(lambda: self.scheduler.now_ms) if virtual_time else None,
+                provisioner=self.provisioner
+            )
+        self.channel = SimulatedChannel(
+            clock=self.scheduler.clock if virtual_time else None
+        )
+        # Span per fase, hop e chiamata al server (quasi gratuito se disabilitato)
+        self.tracer = Tracer(enabled=tracing)
+        # memory_profiling: memoria misurata con tracemalloc al posto del modello sintetico
+        self.memory = MemoryProfiler(enabled=memory_profiling)
+        # streaming_metrics: istogrammi a memoria costante al posto dei campioni
+        self.metrics = SimulationMetrics(streaming=streaming_metrics)
+        # Sink opzionale: ogni handshake e ogni AttackResult viene scritto man mano
+        self.sink = sink
+        self._handshake_energy: Dict[str, Dict[str, float]] = {}
+        # Colonne energia/CPU della flotta, create alla prima esecuzione a blocchi
+        self.fleet: Optional[DeviceFleet] = None
+        
+        # Registra i dispositivi nel server (non serve se il server deriva i vault dal seed)
+        if self.provisioner is None:
+            self.server.register_devices(
+                (device.device_id, device.vault) for device in self.devices
+            )
+        startup_end = time.perf_counter()
+        self._startup_times = {
+            'devices_s': devices_ready - startup_start,
+            'registration_s': startup_end - devices_ready,
+            'total_s': startup_end - startup_start
+        }
+        
+    def close(self):
+        # Termina i processi shard in modalità cluster, altrimenti salva i vault ruotati
+        self.server.close()
+        self.memory.close()
+            
+    def startup_report(self) -> Dict:
+        materialized = (self.devices.materialized if self.provisioner is not None
+                        else len(self.devices))
+        return {
+            'devices': len(self.devices),
+            'provisioning': 'seeded' if self.provisioner is not None else 'eager',
+            'materialized_devices': materialized,
+            **self._startup_times
+        }
+        
+    def memory_report(self) -> Dict:
+        """Memoria misurata per fase e impronta di dispositivo, vault e sessioni aperte"""
+        device = self.devices[0] if len(self.devices) else None
+        sessions = len(self.server.active_sessions)
+        report = {
+            'phases': self.memory.summary(),
+            'device_bytes': deep_sizeof(device) if device is not None else 0,
+            'vault_bytes': deep_sizeof(device.vault) if device is not None else 0,
+            'vault': {'n': device.vault.n, 'm': device.vault.m} if device is not None else {},
+            'active_sessions': sessions
+        }
+        if isinstance(self.server, IoTServer):
+            # Sessioni semiaperte e hot set del registro sul server
+            open_sessions = list(self.server.active_sessions.values())
+            report['session_bytes'] = (
+                deep_sizeof(open_sessions) / len(open_sessions) if open_sessions else 0.0
+            )
+            hot = list(self.server.devices.hot_vaults())
+            report['registry_hot_bytes_per_vault'] = deep_sizeof(hot) / len(hot) if hot else 0.0
+        return report
+        
         
     def run_full_simulation(self):
         # Test di sicurezza
-        security_suite = SecurityTestSuite(self.devices[0], self.server)
+        security_suite = SecurityTestSuite(self.devices[0], self.server, sink=self.sink)
         attack_results = security_suite.run_all_attacks()
         security_report = security_suite.generate_security_report()
         print("\n" + security_report)
         
         # Simulazione normale
+        self.run_authentications()
+        
+    def run_security_campaign(self, attacks: List[str] = None,
+                              attack_kwargs: Dict[str, dict] = None,
+                              max_workers: int = None) -> Dict:
+        """Esegue gli attacchi contro tutta la flotta in parallelo (richiede il seed)"""
+        if self.provisioner is None:
+            raise ValueError("La campagna di sicurezza richiede una flotta con seed")
+        # Carichi ridotti per dispositivo: la statistica viene dall'aggregazione sulla flotta
+        kwargs = {'side_channel': {'num_traces': 2000}, 'dos': {'num_requests': 10000}}
+        kwargs.update(attack_kwargs or {})
+        return run_attack_campaign(self.provisioner, attacks=attacks or list(ATTACKS),
+                                   attack_kwargs=kwargs, max_workers=max_workers,
+                                   sink=self.sink)
+        
+    def checkpoint(self, path: str):
+        """Salva vault e metriche dei dispositivi (solo quelli toccati se la flotta ha un seed)"""
+        write_checkpoint(
+            path, self.devices,
+            provisioner=self.provisioner,
+            fleet=self.fleet,
+            device_offset=self.device_offset,
+            clock_ms=self.scheduler.now_ms if self.virtual_time else 0.0
+        )
+        
+    @classmethod
+    def resume(cls, path: str, virtual_time: bool = False,
+               streaming_metrics: bool = False, tracing: bool = False) -> 'SimulationRunner':
+        # Apertura O(1): i record vengono letti solo per i dispositivi usati
+        checkpoint = FleetCheckpoint(path)
+        runner = cls(checkpoint.num_devices, virtual_time=virtual_time,
+                     device_offset=checkpoint.device_offset, vault_factory=checkpoint.vault_cls,
+                     streaming_metrics=streaming_metrics, tracing=tracing,
+                     provisioner=checkpoint)
+        if virtual_time:
+            runner.scheduler.clock.advance_to(checkpoint.clock_ms)
+        return runner
+        
+    def run_authentications(self):
+        if self.virtual_time:
+            # Gli handshake sono eventi consecutivi sullo scheduler simulato
+            if self.devices:
+                self.scheduler.schedule(0.0, self._authentication_event, 0)
+            self.scheduler.run()
+            return
+            
         for device in self.devices:
             start_time = time.time()
-            self._run_authentication(device)
+            verified = self._run_authentication(device)
             auth_time = (time.time() - start_time) * 1000
+            self._record_measurement(device, auth_time, verified)
+            
+    def run_batched_authentications(self, batch_size: int = 1024):
+        """Handshake a blocchi in lockstep: l'energia di ogni fase è un solo update vettoriale"""
+        if not self.virtual_time:
+            raise ValueError("L'esecuzione a blocchi richiede virtual_time=True")
+        if batch_size < 1:
+            raise ValueError("batch_size deve essere almeno 1")
+        if self.fleet is None:
+            # Dopo un resume le colonne ripartono dalle metriche salvate
+            build_fleet = getattr(self.provisioner, 'build_fleet', None)
+            self.fleet = build_fleet() if build_fleet else DeviceFleet(len(self.devices))
+        # Le colonne partono dalle metriche accumulate dagli oggetti dispositivo (es. in
+        # modalità sequenziale) e alla fine le restituiscono, così le due viste coincidono
+        self.fleet.read_devices(self._materialized_devices())
+        span = self.tracer.span
+        memory = self.memory.phase
+        
+        for start in range(0, len(self.devices), batch_size):
+            # Blocco contiguo: le colonne della flotta vengono aggiornate su viste
+            indices = slice(start, min(start + batch_size, len(self.devices)))
+            devices = [self.devices[i] for i in range(indices.start, indices.stop)]
+            cpu_start = time.perf_counter()
             
-            # Ottieni il profilo energetico completo prima del reset
-            power_profile = device.get_power_profile()
+            with span('phase:init', 'batch'), memory('phase:init', 'batch'):
+                msgs1 = [device.authenticator.initiate_auth() for device in devices]
+                airtime1 = self._airtimes_ms(msgs1)
+                msgs1, delays1 = self.channel.transmit_batch(msgs1)
+                energies = {'init': self._fleet_operation(indices, 'init', airtime1)}
             
-            self.metrics.add_measurement(
-                auth_time=auth_time,
-                power=power_profile['total_energy_mwh'],
-                memory=device.memory_usage
-            )
+            with span('phase:challenge', 'batch'), memory('phase:challenge', 'batch'):
+                msgs2 = self.server.handle_auth_phase1_many(msgs1)
+                msgs2, delays2 = self.channel.transmit_batch(msgs2)
+                energies['challenge'] = self._fleet_operation(indices, 'challenge')
+            
+            with span('phase:response', 'batch'), memory('phase:response', 'batch'):
+                msgs3 = [device.authenticator.handle_challenge(msg)
+                         for device, msg in zip(devices, msgs2)]
+                airtime3 = self._airtimes_ms(msgs3)
+                msgs3, delays3 = self.channel.transmit_batch(msgs3)
+                energies['response'] = self._fleet_operation(indices, 'response', airtime3)
             
-            # Reset delle metriche dopo aver salvato le misurazioni
-            device.reset_metrics()
+            with span('phase:vault_update', 'batch'), memory('phase:vault_update', 'batch'):
+                outcomes = self.server.verify_responses(msgs3)
+                verified = [outcomes[msg.session_id] for msg in msgs3]
+                for device, msg, ok in zip(devices, msgs3, verified):
+                    if ok:
+                        device.vault.update_vault(msg.session_id.encode())
+                energies['vault_update'] = self._fleet_operation(indices, 'vault_update')
             
-    def _run_authentication(self, device: SimulatedIoTDevice):
-        # Fase 1: Inizializzazione
-        msg1 = device.authenticator.initiate_auth()
-        msg1 = self.channel.transmit(msg1)
-        device.simulate_power_consumption(20.0)  # Inizializzazione
+            self.fleet.reset_metrics(indices)
+            # Il tempo di calcolo reale del blocco si somma al tempo simulato
+            self.scheduler.clock.advance((time.perf_counter() - cpu_start) * 1000)
+            # Latenza di ogni dispositivo: i propri ritardi di canale (airtime inclusa)
+            # più le operazioni
+            auth_times = np.add(delays1, delays2) + delays3 + sum(PHASE_DURATIONS_MS.values())
+            powers = self.fleet.power_consumption[indices].tolist()
+            batch_peak = self.memory.pop_handshake('batch')
+            if batch_peak is not None:
+                # Memoria misurata del blocco ripartita tra i suoi handshake
+                memories = [batch_peak / 1024 / len(devices)] * len(devices)
+            else:
+                memories = self.fleet.memory_usage[indices].tolist()
+            self.metrics.add_measurements(auth_times.tolist(), powers, memories, verified)
+            if self.sink is not None:
+                self.sink.write_handshakes([device.device_id for device in devices],
+                                           auth_times.tolist(), powers, memories, verified,
+                                           energies)
         
-        # Fase 2: Challenge del server
-        msg2 = self.server.handle_auth_phase1(msg1)
-        msg2 = self.channel.transmit(msg2)
-        device.simulate_power_consumption(30.0)  # Elaborazione challenge
+        self.fleet.write_devices(self._materialized_devices())
+            
+    def _materialized_devices(self):
+        # Coppie (posizione, dispositivo) dei soli dispositivi già creati
+        materialized = getattr(self.devices, '_devices', None)
+        if materialized is not None:
+            return list(materialized.items())
+        return enumerate(self.devices)
+            
+    def run_open_loop(self, rate_hps: float, duration_s: float, schedule: str = 'poisson',
+                      rng: np.random.Generator = None) -> Dict:
+        """Handshake avviati a un tasso di arrivo prefissato, senza attendere i completamenti"""
+        if schedule not in ARRIVAL_SCHEDULES:
+            raise ValueError(f"Calendario di arrivi sconosciuto: {schedule}")
+        arrivals_ms = ARRIVAL_SCHEDULES[schedule](rate_hps, duration_s, rng)
+        report = OpenLoopLoadGenerator(self).run(arrivals_ms)
+        report['schedule'] = schedule
+        report['target_hps'] = rate_hps
+        return report
+            
+    def _airtimes_ms(self, messages: List) -> np.ndarray:
+        return np.array([self.channel.airtime_ms(msg.wire_size()) for msg in messages])
         
-        # Fase 3: Risposta del device
-        msg3 = device.authenticator.handle_challenge(msg2)
-        msg3 = self.channel.transmit(msg3)
-        device.simulate_power_consumption(40.0)  # Generazione risposta
+    def _fleet_operation(self, indices: slice, phase: str,
+                         airtime_ms: np.ndarray = 0.0) -> np.ndarray:
+        # Equivalente vettoriale di _device_operation per un blocco di dispositivi
+        operation_time_ms = PHASE_DURATIONS_MS[phase]
+        energy = self.fleet.simulate_power_consumption(operation_time_ms + airtime_ms, indices)
+        self.metrics.add_phase_energies(phase, energy.tolist())
+        self.scheduler.clock.advance(operation_time_ms)
+        return energy
+            
+    @classmethod
+    def run_sharded_simulation(cls, num_devices: int, num_workers: int = None,
+                               virtual_time: bool = True,
+                               vault_factory: Callable[[], SecureVault] = SecureVault,
+                               seed: Optional[int] = None,
+                               streaming_metrics: bool = False,
+                               vault_n: int = 10, vault_m: int = 128) -> SimulationMetrics:
+        """Divide la flotta tra più processi e unisce le metriche dei worker"""
+        num_workers = num_workers or os.cpu_count() or 1
+        num_workers = max(1, min(num_workers, num_devices))
         
-        # Fase 4: Verifica finale e aggiornamento vault
-        device.vault.update_vault(msg3.session_id.encode())
-        device.simulate_power_consumption(25.0)  # Aggiornamento vault
+        # Intervalli contigui di dispositivi, il più possibile bilanciati
+        base, extra = divmod(num_devices, num_workers)
+        shards = []
+        offset = 0
+        for worker in range(num_workers):
+            size = base + (1 if worker < extra else 0)
+            shards.append((size, offset))
+            offset += size
+            
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = [pool.submit(_run_shard, size, offset, virtual_time,
+                                   vault_factory, seed, streaming_metrics,
+                                   vault_n, vault_m)
+                       for size, offset in shards]
+            return SimulationMetrics.merged([f.result() for f in futures])
+            
+    def run_concurrent_simulation(self, concurrency: int = 100) -> Dict:
+        """Autentica tutti i dispositivi con al più `concurrency` handshake sovrapposti"""
+        if concurrency < 1:
+            raise ValueError("La concorrenza deve essere almeno 1")
+        if self.memory.enabled:
+            # Il picco di tracemalloc è globale: le fasi interlacciate si azzererebbero a vicenda
+            raise ValueError("memory_profiling non è supportato con handshake concorrenti")
+        if self.virtual_time:
+            # Handshake interlacciati come eventi sullo scheduler, latenze in tempo simulato
+            return self._run_concurrent_virtual(concurrency)
+        return asyncio.run(self._run_concurrent(concurrency))
+        
+    def run_concurrency_sweep(self, levels: List[int]) -> List[Dict]:
+        # Ogni livello riautentica l'intera flotta con una concorrenza diversa
+        return [self.run_concurrent_simulation(level) for level in levels]
+        
+    async def _run_concurrent(self, concurrency: int) -> Dict:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        in_flight = 0
+        peak_in_flight = 0
+        peak_sessions = len(self.server.active_sessions)
+        
+        async def worker(device: SimulatedIoTDevice):
+            nonlocal in_flight, peak_in_flight, peak_sessions
+            async with semaphore:
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                start_time = time.perf_counter()
+                verified = await self._run_authentication_async(device)
+                auth_time = (time.perf_counter() - start_time) * 1000
+                in_flight -= 1
+                peak_sessions = max(peak_sessions, len(self.server.active_sessions))
+                latencies.append(auth_time)
+                self._record_measurement(device, auth_time, verified)
+        
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker(device) for device in self.devices))
+        elapsed_s = time.perf_counter() - start_time
+        return self._concurrency_report(concurrency, latencies, elapsed_s,
+                                        peak_in_flight, peak_sessions)
+        
+    def _run_concurrent_virtual(self, concurrency: int) -> Dict:
+        latencies: List[float] = []
+        pending = iter(range(len(self.devices)))
+        in_flight = 0
+        peak_in_flight = 0
+        peak_sessions = len(self.server.active_sessions)
+        
+        def launch():
+            nonlocal in_flight, peak_in_flight
+            index = next(pending, None)
+            if index is None:
+                return
+            device = self.devices[index]
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            start_ms = self.scheduler.now_ms
+            self._step_event(self._handshake_steps(device), None,
+                             lambda verified: finish(device, start_ms, verified))
+        
+        def finish(device: SimulatedIoTDevice, start_ms: float, verified: bool):
+            nonlocal in_flight, peak_sessions
+            in_flight -= 1
+            peak_sessions = max(peak_sessions, len(self.server.active_sessions))
+            auth_time = self.scheduler.now_ms - start_ms
+            latencies.append(auth_time)
+            self._record_measurement(device, auth_time, verified)
+            # Un handshake concluso libera il posto per il dispositivo successivo
+            launch()
+        
+        start_ms = self.scheduler.now_ms
+        for _ in range(min(concurrency, len(self.devices))):
+            self.scheduler.schedule(0.0, launch)
+        self.scheduler.run()
+        elapsed_s = (self.scheduler.now_ms - start_ms) / 1000
+        return self._concurrency_report(concurrency, latencies, elapsed_s,
+                                        peak_in_flight, peak_sessions)
+        
+    def _concurrency_report(self, concurrency: int, latencies: List[float], elapsed_s: float,
+                            peak_in_flight: int, peak_sessions: int) -> Dict:
+        return {
+            'concurrency': concurrency,
+            'handshakes': len(latencies),
+            'elapsed_s': elapsed_s,
+            'throughput_hps': len(latencies) / elapsed_s if elapsed_s > 0 else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': max(latencies, default=0.0),
+            'peak_in_flight': peak_in_flight,
+            'peak_active_sessions': peak_sessions,
+            'session_stats': self.server.active_sessions.stats()
+        }
+        
+    def _authentication_event(self, index: int):
+        device = self.devices[index]
+        start_time = self.scheduler.now_ms
+        cpu_start = time.perf_counter()
+        verified = self._run_authentication(device)
+        # Il tempo di calcolo reale (crittografia) si somma al tempo simulato
+        self.scheduler.clock.advance((time.perf_counter() - cpu_start) * 1000)
+        self._record_measurement(device, self.scheduler.now_ms - start_time, verified)
+        
+        if index + 1 < len(self.devices):
+            self.scheduler.schedule(0.0, self._authentication_event, index + 1)
+            
+    def _record_measurement(self, device: SimulatedIoTDevice, auth_time: float,
+                            success: bool = True):
+        # Ottieni il profilo energetico completo prima del reset
+        power_profile = device.get_power_profile()
+        # Con il profiling attivo la memoria è il picco misurato dell'handshake (KB)
+        peak_bytes = self.memory.pop_handshake(device.device_id)
+        memory_kb = device.memory_usage if peak_bytes is None else peak_bytes / 1024
+        
+        self.metrics.add_measurement(
+            auth_time=auth_time,
+            power=power_profile['total_energy_mwh'],
+            memory=memory_kb,
+            success=success
+        )
+        if self.sink is not None:
+            self.sink.write_handshake(device.device_id, auth_time,
+                                      power_profile['total_energy_mwh'], memory_kb,
+                                      success, self._handshake_energy.pop(device.device_id, None))
+        
+        # Reset delle metriche dopo aver salvato le misurazioni
+        device.reset_metrics()
+        
+    def _device_operation(self, device: SimulatedIoTDevice, phase: str,
+                          airtime_ms: float = 0.0) -> float:
+        # airtime_ms: trasmissione radio del device, già inclusa nel ritardo del canale
+        operation_time_ms = PHASE_DURATIONS_MS[phase]
+        energy_before = device.power_consumption
+        device.simulate_power_consumption(operation_time_ms + airtime_ms)
+        energy = device.power_consumption - energy_before
+        self.metrics.add_phase_energy(phase, energy)
+        if self.sink is not None:
+            # Per handshake interlacciati l'energia di fase si accumula per dispositivo
+            self._handshake_energy.setdefault(device.device_id, {})[phase] = energy
+        # La durata dell'operazione è attesa da chi esegue l'handshake
+        return operation_time_ms
+            
+    def _handshake_steps(self, device: SimulatedIoTDevice):
+        """Fasi dell'handshake come generatore, comune a tutte le modalità di esecuzione.
+        
+        Produce un AuthenticationMessage da trasmettere (e riceve il messaggio consegnato)
+        oppure la durata in ms di un'operazione del dispositivo; restituisce l'esito.
+        """
+        span = self.tracer.span
+        memory = self.memory.phase
+        track = device.device_id
+        with span('handshake', track):
+            # Fase 1: Inizializzazione
+            with span('phase:init', track), memory('phase:init', track):
+                msg1 = device.authenticator.initiate_auth()
+                airtime_ms = self.channel.airtime_ms(msg1.wire_size())
+                with span('channel.transmit', track):
+                    msg1 = yield msg1
+                yield self._device_operation(device, 'init', airtime_ms)  # Inizializzazione
+            
+            # Fase 2: Challenge del server
+            with span('phase:challenge', track), memory('phase:challenge', track):
+                with span('server.handle_auth_phase1', track):
+                    msg2 = self.server.handle_auth_phase1(msg1)
+                with span('channel.transmit', track):
+                    msg2 = yield msg2
+                yield self._device_operation(device, 'challenge')  # Elaborazione challenge
+            
+            # Fase 3: Risposta del device
+            with span('phase:response', track), memory('phase:response', track):
+                msg3 = device.authenticator.handle_challenge(msg2)
+                airtime_ms = self.channel.airtime_ms(msg3.wire_size())
+                with span('channel.transmit', track):
+                    msg3 = yield msg3
+                yield self._device_operation(device, 'response', airtime_ms)  # Generazione risposta
+            
+            # Fase 4: Verifica finale e aggiornamento vault su entrambi i lati
+            with span('phase:vault_update', track), memory('phase:vault_update', track):
+                with span('server.handle_auth_phase2', track):
+                    verified = self.server.handle_auth_phase2(msg3)
+                if verified:
+                    device.vault.update_vault(msg3.session_id.encode())
+                yield self._device_operation(device, 'vault_update')  # Aggiornamento vault
         
         # Reset CPU usage per la prossima autenticazione
-        device.reset_metrics() 
\ No newline at end of file
+        device.reset_metrics()
+        return verified
+        
+    def _run_authentication(self, device: SimulatedIoTDevice) -> bool:
+        steps = self._handshake_steps(device)
+        received = None
+        while True:
+            try:
+                step = steps.send(received)
+            except StopIteration as done:
+                return done.value
+            if isinstance(step, AuthenticationMessage):
+                received = self.channel.transmit(step)
+            else:
+                received = None
+                if self.virtual_time:
+                    self.scheduler.clock.advance(step)
+        
+    async def _run_authentication_async(self, device: SimulatedIoTDevice) -> bool:
+        # Tempo reale: le trasmissioni cedono il controllo agli altri handshake
+        steps = self._handshake_steps(device)
+        received = None
+        while True:
+            try:
+                step = steps.send(received)
+            except StopIteration as done:
+                return done.value
+            received = (await self.channel.transmit_async(step)
+                        if isinstance(step, AuthenticationMessage) else None)
+        
+    def _step_event(self, steps, received, on_done: Callable[[bool], None]):
+        # Tempo simulato: ogni trasmissione od operazione diventa un evento futuro
+        cpu_start = time.perf_counter()
+        try:
+            step = steps.send(received)
+        except StopIteration as done:
+            on_done(done.value)
+            return
+        # Il calcolo reale avanza il clock condiviso: server e dispositivi simulati usano
+        # la stessa CPU, quindi oltre la sua capacità gli eventi successivi ritardano
+        self.scheduler.clock.advance((time.perf_counter() - cpu_start) * 1000)
+        if isinstance(step, AuthenticationMessage):
+            message, delay_ms = self.channel.send(step)
+            self.scheduler.schedule(delay_ms, self._step_event, steps, message, on_done)
+        else:
+            self.scheduler.schedule(step, self._step_event, steps, None, on_done)
+
+def _run_shard(num_devices: int, device_offset: int, virtual_time: bool,
+               vault_factory: Callable[[], SecureVault],
+               seed: Optional[int] = None,
+               streaming_metrics: bool = False,
+               vault_n: int = 10, vault_m: int = 128) -> SimulationMetrics:
+    # Ogni worker possiede i propri dispositivi e uno shard del server
+    runner = SimulationRunner(num_devices, virtual_time=virtual_time,
+                              device_offset=device_offset,
+                              vault_factory=vault_factory, seed=seed,
+                              streaming_metrics=streaming_metrics,
+                              vault_n=vault_n, vault_m=vault_m)
+    runner.run_authentications()
+    return runner.metrics
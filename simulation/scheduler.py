@@ -0,0 +1,51 @@
+import heapq
+import itertools
+from typing import Any, Callable, List, Tuple
+
+class VirtualClock:
+    """Orologio simulato: il tempo avanza solo quando viene richiesto"""
+    def __init__(self, start_ms: float = 0.0):
+        self.now_ms = start_ms
+
+    def advance(self, delay_ms: float):
+        if delay_ms < 0:
+            raise ValueError("Il tempo simulato non può tornare indietro")
+        self.now_ms += delay_ms
+
+    def advance_to(self, time_ms: float):
+        self.advance(time_ms - self.now_ms)
+
+class EventScheduler:
+    """Scheduler a eventi discreti basato su un VirtualClock"""
+    def __init__(self, clock: VirtualClock = None):
+        self.clock = clock or VirtualClock()
+        self._queue: List[Tuple[float, int, Callable, tuple]] = []
+        self._counter = itertools.count()  # ordine FIFO a parità di tempo
+        self.processed_events = 0
+
+    @property
+    def now_ms(self) -> float:
+        return self.clock.now_ms
+
+    def schedule(self, delay_ms: float, callback: Callable, *args: Any):
+        self.schedule_at(self.clock.now_ms + delay_ms, callback, *args)
+
+    def schedule_at(self, time_ms: float, callback: Callable, *args: Any):
+        if time_ms < self.clock.now_ms:
+            raise ValueError("Impossibile schedulare un evento nel passato")
+        heapq.heappush(self._queue, (time_ms, next(self._counter), callback, args))
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def run(self, until_ms: float = None):
+        while self._queue:
+            time_ms, _, callback, args = self._queue[0]
+            if until_ms is not None and time_ms > until_ms:
+                break
+            heapq.heappop(self._queue)
+            # Il clock può essere già avanzato oltre l'evento da un callback precedente
+            if time_ms > self.clock.now_ms:
+                self.clock.advance_to(time_ms)
+            callback(*args)
+            self.processed_events += 1
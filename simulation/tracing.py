@@ -0,0 +1,131 @@
+import json
+import time
+from typing import Dict, List
+
+class _NullSpan:
+    """Span vuoto condiviso: con il tracing disabilitato non si alloca nulla"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'track', 'path', 'start_ns', 'cpu_start_ns')
+
+    def __init__(self, tracer: 'Tracer', name: str, track: str):
+        self.tracer = tracer
+        self.name = name
+        self.track = track
+
+    def __enter__(self):
+        # Lo stack è per traccia: gli handshake asincroni interlacciati non si mescolano
+        stack = self.tracer._stacks.setdefault(self.track, [])
+        self.path = f"{stack[-1]};{self.name}" if stack else self.name
+        stack.append(self.path)
+        self.cpu_start_ns = time.thread_time_ns()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        # In modalità asincrona il tempo CPU include anche gli handshake interlacciati
+        cpu_ns = time.thread_time_ns() - self.cpu_start_ns
+        stack = self.tracer._stacks[self.track]
+        stack.pop()
+        if not stack:
+            del self.tracer._stacks[self.track]
+        self.tracer._record(self, end_ns - self.start_ns, cpu_ns)
+        return False
+
+class Tracer:
+    """Registra span (fasi, hop di canale, chiamate al server) con perf_counter_ns"""
+    def __init__(self, enabled: bool = False, max_spans: int = 1_000_000):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        # (nome, percorso, traccia, inizio ns, durata ns, cpu ns)
+        self.spans: List[tuple] = []
+        self.dropped = 0
+        self._stacks: Dict[str, List[str]] = {}
+        self._origin_ns = time.perf_counter_ns()
+
+    def span(self, name: str, track: str = 'main'):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, track)
+
+    def _record(self, span: _Span, duration_ns: int, cpu_ns: int):
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return
+        self.spans.append((span.name, span.path, span.track,
+                           span.start_ns, duration_ns, cpu_ns))
+
+    def clear(self):
+        self.spans.clear()
+        self.dropped = 0
+
+    def to_chrome_trace(self) -> dict:
+        """Formato Trace Event JSON, leggibile da chrome://tracing e Perfetto"""
+        tids: Dict[str, int] = {}
+        events = []
+        for name, path, track, start_ns, duration_ns, cpu_ns in self.spans:
+            tid = tids.setdefault(track, len(tids) + 1)
+            events.append({
+                'name': name,
+                'cat': path.split(';', 1)[0],
+                'ph': 'X',
+                'ts': (start_ns - self._origin_ns) / 1000,
+                'dur': duration_ns / 1000,
+                'pid': 1,
+                'tid': tid,
+                'args': {'cpu_us': cpu_ns / 1000}
+            })
+        # Nomi delle tracce (un dispositivo per riga nel viewer)
+        for track, tid in tids.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+                           'args': {'name': track}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def summary(self) -> List[Dict[str, float]]:
+        """Aggregazione per percorso di stack, ordinata per tempo totale"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for _, path, _, _, duration_ns, cpu_ns in self.spans:
+            entry = totals.setdefault(path, {'count': 0, 'total_ns': 0, 'cpu_ns': 0,
+                                             'child_ns': 0})
+            entry['count'] += 1
+            entry['total_ns'] += duration_ns
+            entry['cpu_ns'] += cpu_ns
+            parent = path.rpartition(';')[0]
+            if parent:
+                totals.setdefault(parent, {'count': 0, 'total_ns': 0, 'cpu_ns': 0,
+                                           'child_ns': 0})['child_ns'] += duration_ns
+
+        rows = []
+        for path, entry in totals.items():
+            count = entry['count'] or 1
+            rows.append({
+                'path': path,
+                'count': entry['count'],
+                'total_ms': entry['total_ns'] / 1e6,
+                'self_ms': max(0, entry['total_ns'] - entry['child_ns']) / 1e6,
+                'cpu_ms': entry['cpu_ns'] / 1e6,
+                'mean_us': entry['total_ns'] / count / 1000
+            })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def export_folded(self, path: str):
+        # Formato "a;b;c valore" di flamegraph.pl / speedscope (tempo proprio in µs)
+        with open(path, 'w') as f:
+            for row in self.summary():
+                if row['self_ms'] > 0:
+                    f.write(f"{row['path']} {int(row['self_ms'] * 1000)}\n")
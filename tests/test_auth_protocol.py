@@ -0,0 +1,49 @@
+import secrets
+import pytest
+from src.security.auth_protocol import WIRE_HEADER, AuthenticationMessage
+
+def _session_id() -> str:
+    return secrets.token_hex(16)
+
+def test_round_trip_with_all_fields():
+    msg = AuthenticationMessage(_session_id(), 'dev_42', [0, 7, 65535],
+                                secrets.token_bytes(32), secrets.token_bytes(32))
+    data = msg.to_bytes()
+    assert len(data) == msg.wire_size()
+    decoded = AuthenticationMessage.from_bytes(data)
+    assert decoded == msg
+    assert bytes(decoded.response) == msg.response
+
+def test_absent_and_empty_fields_are_distinguished():
+    msg = AuthenticationMessage(_session_id(), device_id='', challenge=[])
+    decoded = AuthenticationMessage.from_bytes(msg.to_bytes())
+    assert decoded.device_id == ''
+    assert decoded.challenge == []
+    assert decoded.random_number is None
+    assert decoded.response is None
+    assert len(msg.to_bytes()) == WIRE_HEADER.size
+
+def test_round_trip_from_bytearray_and_memoryview():
+    msg = AuthenticationMessage(_session_id(), 'dev_0', random_number=b'\x01' * 16)
+    data = msg.to_bytes()
+    assert AuthenticationMessage.from_bytes(bytearray(data)) == msg
+    assert AuthenticationMessage.from_bytes(memoryview(data)) == msg
+
+@pytest.mark.parametrize('msg', [
+    AuthenticationMessage('not-hex'),
+    AuthenticationMessage('ab' * 8),
+    AuthenticationMessage('ab' * 16, challenge=[70000]),
+    AuthenticationMessage('ab' * 16, device_id='x' * 256),
+])
+def test_unencodable_messages_are_rejected(msg):
+    with pytest.raises(ValueError):
+        msg.to_bytes()
+
+def test_malformed_input_is_rejected():
+    data = AuthenticationMessage(_session_id(), 'dev_0', [1, 2, 3]).to_bytes()
+    with pytest.raises(ValueError):
+        AuthenticationMessage.from_bytes(data[:WIRE_HEADER.size - 1])
+    with pytest.raises(ValueError):
+        AuthenticationMessage.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        AuthenticationMessage.from_bytes(b'\x02' + data[1:])
@@ -0,0 +1,46 @@
+import threading
+import pytest
+from src.device.iot_device import SimulatedIoTDevice
+from src.server.cluster import IoTServerCluster
+from src.server.rate_limiter import AuthRateLimiter, RateLimitExceeded
+from src.security.auth_protocol import AuthenticationMessage
+
+@pytest.fixture
+def cluster():
+    with IoTServerCluster(num_shards=2) as cluster:
+        yield cluster
+
+def _device_on_other_shard(cluster, shard):
+    # Primo dispositivo il cui ID appartiene a uno shard diverso da quello indicato
+    index = 0
+    while cluster.shard_for(f"dev_{index}") == shard:
+        index += 1
+    return SimulatedIoTDevice(f"dev_{index}")
+
+def test_shard_error_does_not_leave_locks_held(cluster):
+    unknown = AuthenticationMessage(session_id='0' * 32, device_id='sconosciuto')
+    device = _device_on_other_shard(cluster, cluster.shard_for(unknown.device_id))
+    cluster.register_device(device.device_id, device.vault)
+
+    with pytest.raises(ValueError):
+        cluster.handle_auth_phase1_many([unknown, device.authenticator.initiate_auth()])
+
+    assert not any(shard.lock.locked() for shard in cluster.shards.values())
+    # Le pipe restano sincronizzate: la richiesta successiva riceve la propria risposta
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(stats=cluster.stats()))
+    worker.start()
+    worker.join(timeout=10)
+    assert 'stats' in result
+    assert len(result['stats']) == 2
+
+def test_router_enforces_rate_limiter():
+    with IoTServerCluster(num_shards=1) as cluster:
+        # Come fa test_dos_attack: il limiter viene installato sull'attributo del router
+        cluster.rate_limiter = AuthRateLimiter()
+        device = SimulatedIoTDevice("dev_0")
+        cluster.register_device(device.device_id, device.vault)
+        msg = device.authenticator.initiate_auth()
+        with pytest.raises(RateLimitExceeded):
+            for _ in range(1000):
+                cluster.handle_auth_phase1(msg, source='attacker')
@@ -0,0 +1,41 @@
+import sqlite3
+from src.security.secure_vault import SecureVault
+from src.server.device_registry import DeviceRegistry
+
+def _registry(num_devices: int, hot_set_size: int):
+    db = sqlite3.connect(':memory:')
+    db.execute('CREATE TABLE devices (device_id TEXT PRIMARY KEY, vault_data BLOB)')
+    registry = DeviceRegistry(db, hot_set_size)
+    vaults = {f"dev_{i}": SecureVault() for i in range(num_devices)}
+    registry.register_many(vaults.items())
+    return db, registry, vaults
+
+def test_clean_evictions_do_not_write():
+    db, registry, _ = _registry(8, hot_set_size=2)
+    writes = db.total_changes
+    for _ in range(3):
+        for i in range(8):
+            registry.get(f"dev_{i}")
+    assert registry.evictions > 0
+    assert db.total_changes == writes
+
+def test_dirty_eviction_is_written_back():
+    db, registry, vaults = _registry(4, hot_set_size=1)
+    vault = registry.get('dev_0')
+    vault.update_vault(b'session')
+    registry.mark_dirty('dev_0')
+    writes = db.total_changes
+    registry.get('dev_1')
+    assert db.total_changes == writes + 1
+    # Il vault ricaricato dal database è quello ruotato
+    reloaded = registry.get('dev_0').get_keys_by_indices([0])
+    assert reloaded == vault.get_keys_by_indices([0])
+    assert reloaded != vaults['dev_0'].get_keys_by_indices([0])
+
+def test_hot_vaults_follow_lru_order():
+    _, registry, _ = _registry(4, hot_set_size=2)
+    for device_id in ('dev_0', 'dev_1', 'dev_2', 'dev_1'):
+        registry.get(device_id)
+    hot = list(registry.hot_vaults())
+    assert hot == [registry.get('dev_2'), registry.get('dev_1')]
+    assert registry.stats()['hot_set'] == 2
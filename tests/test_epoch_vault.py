@@ -0,0 +1,68 @@
+from src.security.epoch_vault import EpochVault
+from src.simulation.runner import SimulationRunner
+
+def _response(vault: EpochVault, challenge, session: bytes):
+    return challenge, vault.generate_response(challenge), session
+
+def test_serialized_size_is_fixed_across_epochs():
+    vault = EpochVault(history=4)
+    size = len(vault.to_bytes())
+    for i in range(6):
+        vault.update_vault(b'session-%d' % i)
+        assert len(vault.to_bytes()) == size
+
+def test_from_bytes_restores_window():
+    vault = EpochVault(history=3)
+    for i in range(5):
+        vault.update_vault(b'session-%d' % i)
+    restored = EpochVault.from_bytes(vault.to_bytes())
+    assert restored.history == 3
+    assert restored.epoch == vault.epoch
+    assert restored.cache_stats()['history'] == 3
+    challenge = [1, 4, 7]
+    for epoch in range(vault.epoch - 2, vault.epoch + 1):
+        assert (restored.generate_response(challenge, epoch)
+                == vault.generate_response(challenge, epoch))
+
+def test_replayed_old_response_does_not_lock_out_device():
+    device = EpochVault()
+    server = EpochVault.from_bytes(device.to_bytes())
+    challenge = [0, 1, 2]
+    replayed = _response(device, challenge, b'attacker')
+    for i in range(3):
+        item = _response(device, challenge, b'session-%d' % i)
+        assert server.verify_and_rotate([item]) == [True]
+        device.update_vault(item[2])
+
+    # La risposta riprodotta è nella finestra, ma non deve rimuovere gli stati più recenti
+    server.verify_and_rotate([replayed])
+    assert server.verify_and_rotate([_response(device, challenge, b'next')]) == [True]
+
+def _authenticate(runner: SimulationRunner, position: int, times: int):
+    device = runner.devices[position]
+    for _ in range(times):
+        assert runner._run_authentication(device)
+
+def test_checkpoint_resume_with_mixed_epochs_seeded(tmp_path):
+    path = str(tmp_path / 'fleet.ckpt')
+    runner = SimulationRunner(4, virtual_time=True, seed=7, vault_factory=EpochVault)
+    _authenticate(runner, 0, 1)
+    _authenticate(runner, 1, 3)
+    runner.checkpoint(path)
+
+    resumed = SimulationRunner.resume(path, virtual_time=True)
+    assert [resumed.devices[i].vault.epoch for i in range(3)] == [1, 3, 0]
+    for position in range(4):
+        _authenticate(resumed, position, 1)
+
+def test_checkpoint_resume_with_mixed_epochs_eager(tmp_path):
+    path = str(tmp_path / 'fleet.ckpt')
+    runner = SimulationRunner(3, virtual_time=True, vault_factory=EpochVault)
+    runner.run_authentications()
+    _authenticate(runner, 2, 1)
+    runner.checkpoint(path)
+
+    resumed = SimulationRunner.resume(path, virtual_time=True)
+    assert [device.vault.epoch for device in resumed.devices] == [1, 1, 2]
+    for position in range(3):
+        _authenticate(resumed, position, 1)
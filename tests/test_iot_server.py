@@ -0,0 +1,39 @@
+from src.device.iot_device import SimulatedIoTDevice
+from src.server.iot_server import IoTServer
+
+def _handshake(server: IoTServer, device: SimulatedIoTDevice) -> bool:
+    challenge = server.handle_auth_phase1(device.authenticator.initiate_auth())
+    response = device.authenticator.handle_challenge(challenge)
+    verified = server.handle_auth_phase2(response)
+    if verified:
+        device.vault.update_vault(response.session_id.encode())
+    return verified
+
+def test_rotated_vault_survives_restart(tmp_path):
+    db_path = str(tmp_path / 'devices.db')
+    device = SimulatedIoTDevice('dev_0')
+    server = IoTServer(db_path=db_path)
+    server.register_device(device.device_id, device.vault)
+    assert _handshake(server, device)
+    server.close()
+
+    # Il server riaperto deve ripartire dal vault ruotato, non da quello registrato
+    restarted = IoTServer(db_path=db_path)
+    assert _handshake(restarted, device)
+    restarted.close()
+
+def test_rotations_are_flushed_in_batches(tmp_path):
+    server = IoTServer(db_path=str(tmp_path / 'devices.db'), flush_every=3,
+                       flush_interval_ms=float('inf'))
+    devices = [SimulatedIoTDevice(f"dev_{i}") for i in range(3)]
+    server.register_devices((device.device_id, device.vault) for device in devices)
+    writes = server.db.total_changes
+    for device in devices[:2]:
+        assert _handshake(server, device)
+    # Sotto la soglia nessuna scrittura: i vault ruotati restano in attesa
+    assert server.db.total_changes == writes
+    assert server.devices.dirty_count == 2
+    assert _handshake(server, devices[2])
+    assert server.db.total_changes == writes + 3
+    assert server.devices.dirty_count == 0
+    server.close()
@@ -0,0 +1,47 @@
+import pytest
+from src.simulation.memory import MemoryProfiler
+from src.simulation.runner import SimulationRunner
+
+def test_overlapping_phases_are_rejected():
+    profiler = MemoryProfiler(enabled=True)
+    try:
+        with profiler.phase('phase:init', 'dev_0'):
+            with pytest.raises(ValueError):
+                with profiler.phase('phase:init', 'dev_1'):
+                    pass
+        # Dopo la chiusura della prima fase se ne può aprire un'altra
+        with profiler.phase('phase:challenge', 'dev_0'):
+            pass
+        assert profiler.summary()['phase:init']['count'] == 1
+    finally:
+        profiler.close()
+
+@pytest.mark.parametrize('virtual_time', [True, False])
+def test_concurrent_mode_rejects_memory_profiling(virtual_time):
+    runner = SimulationRunner(3, virtual_time=virtual_time, memory_profiling=True)
+    try:
+        with pytest.raises(ValueError):
+            runner.run_concurrent_simulation(2)
+    finally:
+        runner.close()
+
+def test_sequential_mode_profiles_every_phase():
+    runner = SimulationRunner(3, virtual_time=True, memory_profiling=True)
+    try:
+        runner.run_authentications()
+        phases = runner.memory_report()['phases']
+        assert {name: stats['count'] for name, stats in phases.items()} == {
+            'phase:init': 3, 'phase:challenge': 3, 'phase:response': 3, 'phase:vault_update': 3
+        }
+    finally:
+        runner.close()
+
+def test_memory_report_measures_sessions_and_hot_set():
+    runner = SimulationRunner(2, virtual_time=True)
+    device = runner.devices[0]
+    runner.server.handle_auth_phase1(device.authenticator.initiate_auth())
+    report = runner.memory_report()
+    assert report['active_sessions'] == 1
+    assert report['session_bytes'] > 0
+    assert report['registry_hot_bytes_per_vault'] > 0
+    runner.close()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from src.simulation.metrics import StreamingHistogram
+
+def _recorded(values, **kwargs) -> StreamingHistogram:
+    histogram = StreamingHistogram(**kwargs)
+    for value in values:
+        histogram.record(float(value))
+    return histogram
+
+def test_percentiles_within_relative_error():
+    values = np.random.default_rng(3).lognormal(3.0, 1.0, 20000)
+    histogram = _recorded(values)
+    for p in (50, 90, 99, 99.9):
+        exact = np.percentile(values, p, method='inverted_cdf')
+        estimate = histogram.percentile(p)
+        # Limite superiore del bucket: mai sotto il valore esatto, al più 1/sub_buckets sopra
+        assert exact <= estimate <= exact * (1 + 1 / histogram.sub_buckets)
+    assert histogram.percentile(100) == values.max()
+    assert histogram.mean == pytest.approx(values.mean())
+
+def test_zeros_and_empty_histogram():
+    assert StreamingHistogram().percentile(50) == 0.0
+    histogram = _recorded([0.0] * 6 + [5.0] * 4)
+    assert histogram.percentile(50) == 0.0
+    assert 5.0 <= histogram.percentile(70) <= 5.0 * (1 + 1 / histogram.sub_buckets)
+
+def test_merge_matches_single_histogram():
+    rng = np.random.default_rng(4)
+    first, second = rng.exponential(10.0, 5000), rng.exponential(200.0, 3000)
+    merged = _recorded(first)
+    merged.merge(_recorded(second))
+    combined = _recorded(np.concatenate([first, second]))
+    assert list(merged.counts) == list(combined.counts)
+    assert (merged.count, merged.min, merged.max) == (combined.count, combined.min, combined.max)
+    for p in (50, 95, 99):
+        assert merged.percentile(p) == combined.percentile(p)
+
+def test_merge_rejects_different_configuration():
+    with pytest.raises(ValueError):
+        StreamingHistogram().merge(StreamingHistogram(sub_buckets=64))
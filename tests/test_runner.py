@@ -0,0 +1,37 @@
+import pytest
+from src.simulation.checkpoint import FleetCheckpoint
+from src.simulation.runner import SimulationRunner
+
+@pytest.mark.parametrize('seed', [None, 5])
+def test_batched_round_keeps_sequential_totals(tmp_path, seed):
+    path = str(tmp_path / 'fleet.ckpt')
+    runner = SimulationRunner(4, virtual_time=True, seed=seed)
+    runner.run_authentications()
+    sequential = [runner.devices[i].power_consumption for i in range(4)]
+    attempts = runner.devices[0].auth_attempts
+    runner.run_batched_authentications(batch_size=3)
+    batched = list(runner.fleet.power_consumption)
+    # Le colonne partono dai totali sequenziali e vi aggiungono l'energia del blocco
+    assert all(b > s > 0 for b, s in zip(batched, sequential))
+    assert [runner.devices[i].power_consumption for i in range(4)] == batched
+    assert [runner.devices[i].auth_attempts for i in range(4)] == [attempts + 1] * 4
+
+    # Un altro giro sequenziale dopo il blocco finisce anch'esso nel checkpoint
+    runner.run_authentications()
+    runner.checkpoint(path)
+    records = FleetCheckpoint(path).records
+    assert list(records['auth_attempts']) == [2 * attempts + 1] * 4
+    assert list(records['power_consumption']) == [runner.devices[i].power_consumption
+                                                  for i in range(4)]
+
+def test_checkpoint_resolves_ids_like_the_provisioner(tmp_path):
+    path = str(tmp_path / 'fleet.ckpt')
+    runner = SimulationRunner(3, virtual_time=True, seed=2, device_offset=10)
+    runner.run_authentications()
+    runner.checkpoint(path)
+    checkpoint = FleetCheckpoint(path)
+    for device_id in ('dev_10', 'dev_12', 'dev_9', 'dev_13', 'dev_x', 'node_10', None):
+        assert checkpoint.index_of(device_id) == runner.provisioner.index_of(device_id)
+    # Il vault letto dal checkpoint è quello ruotato, non quello derivato dal seed
+    assert checkpoint.vault_for('dev_11').epoch == runner.devices[1].vault.epoch == 1
+    assert checkpoint.vault_for('dev_13') is None
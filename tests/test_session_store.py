@@ -0,0 +1,88 @@
+import pytest
+from src.server.session_store import SessionStore
+
+class _Clock:
+    def __init__(self):
+        self.now_ms = 0.0
+
+    def __call__(self) -> float:
+        return self.now_ms
+
+def _store(**kwargs):
+    clock = _Clock()
+    return clock, SessionStore(clock=clock, **kwargs)
+
+def test_session_expires_after_ttl():
+    clock, store = _store(ttl_ms=1000, tick_ms=100)
+    store['s1'] = {'device_id': 'dev_0'}
+    clock.now_ms = 999
+    assert 's1' in store
+    clock.now_ms = 1200
+    assert 's1' not in store
+    assert store.stats()['expired'] == 1
+    assert len(store) == 0
+
+def test_custom_ttl_per_session():
+    clock, store = _store(ttl_ms=1000, tick_ms=100)
+    store.add('short', {'device_id': 'dev_0'}, ttl_ms=200)
+    store.add('long', {'device_id': 'dev_1'})
+    clock.now_ms = 400
+    assert 'short' not in store
+    assert 'long' in store
+
+def test_ttl_longer_than_one_wheel_turn():
+    # 8 slot da 100 ms: la ruota fa un giro ogni 800 ms, il TTL ne dura più di sei
+    clock, store = _store(ttl_ms=5000, tick_ms=100, num_slots=8)
+    store['s1'] = {'device_id': 'dev_0'}
+    for now_ms in range(100, 5000, 100):
+        clock.now_ms = now_ms
+        assert 's1' in store
+    clock.now_ms = 5200
+    assert 's1' not in store
+    assert store.stats()['expired'] == 1
+
+def test_clock_jump_past_several_turns_expires_everything_due():
+    clock, store = _store(ttl_ms=300, tick_ms=100, num_slots=4)
+    for i in range(10):
+        store[f's{i}'] = {'device_id': f'dev_{i}'}
+    clock.now_ms = 10000
+    assert store.expire() == 10
+    assert len(store) == 0
+
+def test_per_device_cap_evicts_oldest_session():
+    _, store = _store(max_sessions_per_device=2)
+    for i in range(3):
+        store[f'a{i}'] = {'device_id': 'dev_0'}
+    store['b0'] = {'device_id': 'dev_1'}
+    assert 'a0' not in store
+    assert 'a1' in store and 'a2' in store and 'b0' in store
+    assert store.stats()['evicted_device_cap'] == 1
+    assert store.stats()['devices'] == 2
+
+def test_global_cap_evicts_oldest_session():
+    _, store = _store(max_sessions=2, max_sessions_per_device=None)
+    for i in range(3):
+        store[f's{i}'] = {'device_id': f'dev_{i}'}
+    assert 's0' not in store
+    assert 's1' in store and 's2' in store
+    assert store.stats()['evicted_capacity'] == 1
+
+def test_complete_removes_session_once():
+    _, store = _store()
+    store['s1'] = {'device_id': 'dev_0'}
+    assert store.complete('s1') == {'device_id': 'dev_0'}
+    assert store.complete('s1') is None
+    assert store.stats()['completed'] == 1
+
+def test_invalid_caps_are_rejected():
+    with pytest.raises(ValueError):
+        SessionStore(max_sessions_per_device=0)
+    with pytest.raises(ValueError):
+        SessionStore(max_sessions=0)
+
+def test_values_skips_expired_sessions():
+    clock, store = _store(ttl_ms=1000, tick_ms=100)
+    store.add('old', {'device_id': 'dev_0'}, ttl_ms=100)
+    store['new'] = {'device_id': 'dev_1'}
+    clock.now_ms = 500
+    assert list(store.values()) == [{'device_id': 'dev_1'}]
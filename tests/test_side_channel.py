@@ -0,0 +1,28 @@
+import numpy as np
+from src.security.side_channel import correlation_matrix, welch_t_test
+
+def _traces(rng, rows: int = 5000, samples: int = 12):
+    traces = rng.normal(330.0, 1.6, (rows, samples)).astype(np.float32)
+    group = rng.random(rows) < 0.5
+    traces[group, 3] += 0.2
+    hypotheses = rng.integers(0, 9, (rows, 4)).astype(np.uint8)
+    traces[:, 5] += 0.3 * hypotheses[:, 1]
+    return traces, group, hypotheses
+
+def test_chunked_statistics_match_direct_computation():
+    traces, group, hypotheses = _traces(np.random.default_rng(1))
+
+    t = traces.astype(np.float64)
+    a, b = t[group], t[~group]
+    expected_t = (a.mean(0) - b.mean(0)) / np.sqrt(a.var(0, ddof=1) / len(a)
+                                                    + b.var(0, ddof=1) / len(b))
+    # Blocchi piccoli: più passate parziali, incluso un ultimo blocco incompleto
+    np.testing.assert_allclose(welch_t_test(traces, group, chunk_rows=777), expected_t,
+                               atol=1e-3)
+
+    tc = t - t.mean(0)
+    hc = hypotheses - hypotheses.mean(0)
+    expected_rho = (hc.T @ tc) / np.outer(np.sqrt((hc * hc).sum(0)), np.sqrt((tc * tc).sum(0)))
+    rho = correlation_matrix(traces, hypotheses, chunk_rows=777)
+    np.testing.assert_allclose(rho, expected_rho, atol=1e-5)
+    assert np.argmax(np.abs(rho).max(axis=0)) == 5